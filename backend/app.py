@@ -1,36 +1,335 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response
 from flask_cors import CORS
-import pandas as pd
+from werkzeug.exceptions import HTTPException
 import numpy as np
-import joblib
+import json
+import logging
+import hmac
+import os
+import threading
+import time
+from forest import FlatForest, load_flat_forest
+from cache import PredictionCache, make_key_function
+from features import FeaturePipeline, CLASS_NAMES, DEFAULT_INDUSTRY, INDUSTRY_FIELD
+from metrics import Registry
+from sensitivity import parse_axes, grid_size, expand_grid
+from request_log import get_logger, log_event, sampled
 
 app = Flask(__name__)
 CORS(app) # Enable CORS for Next.js
 
+log = get_logger()
+
+# ---------------------------------------------------------
+# Metrics (GET /metrics, Prometheus text format)
+# ---------------------------------------------------------
+metrics = Registry()
+REQUESTS = metrics.counter('tkd_requests_total', 'Prediction requests', ('endpoint',))
+ERRORS = metrics.counter('tkd_errors_total', 'Failed prediction requests', ('endpoint', 'status'))
+BATCH_ROWS = metrics.counter('tkd_batch_rows_total', 'Rows received by /predict/batch', ('result',))
+UNKNOWN_INDUSTRY = metrics.counter('tkd_unknown_industry_total', 'Rows scored with global_mean because the industry is unknown')
+PREDICTIONS = metrics.counter('tkd_predictions_total', 'Predicted tiers', ('tier',))
+REQUEST_SECONDS = metrics.histogram('tkd_request_seconds', 'Request handling time', ('endpoint',))
+STAGE_SECONDS = metrics.histogram('tkd_stage_seconds', 'Time per request stage', ('endpoint', 'stage'))
+RELOADS = metrics.counter('tkd_model_reloads_total', 'Model (re)loads', ('result',))
+metrics.gauge('tkd_model_info', 'Model version currently serving',
+              lambda: {(state.version,): 1} if state is not None else {}, ('version',))
+metrics.gauge('tkd_cache', 'Prediction cache size and hit / miss / eviction / expiration totals (current model)',
+              lambda: {(k,): v for k, v in state.cache.stats().items() if k in CACHE_STATS} if state is not None else {},
+              ('stat',))
+
+CACHE_STATS = ('size', 'hits', 'misses', 'evictions', 'expirations')
+
+# Unknown industries are counted on every row but logged once each
+_logged_industries = set()
+
+class stage:
+    # `with stage(endpoint, name, timings):` times one stage (parse / features /
+    # inference / serialize) into the histogram and into `timings` (seconds).
+    # A plain class rather than @contextmanager: it runs several times per request.
+    __slots__ = ('endpoint', 'name', 'timings', 'start')
+
+    def __init__(self, endpoint, name, timings):
+        self.endpoint = endpoint
+        self.name = name
+        self.timings = timings
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.start
+        STAGE_SECONDS.observe(elapsed, self.endpoint, self.name)
+        self.timings[self.name] = elapsed
+
+def count_unknown_industries(pipeline, industry_keys):
+    unknown = [k for k in industry_keys if k not in pipeline.industry_map]
+    if unknown:
+        UNKNOWN_INDUSTRY.inc(amount=len(unknown))
+        for key in set(unknown) - _logged_industries:
+            if len(_logged_industries) < 1000:
+                _logged_industries.add(key)
+                log_event(log, logging.WARNING, 'unknown_industry', industry=key, fallback=pipeline.global_mean)
+
+def count_predictions(tier_codes):
+    counts = np.bincount(tier_codes)
+    for code in np.flatnonzero(counts).tolist():
+        PREDICTIONS.inc(CLASS_NAMES.get(code, 'Unknown'), amount=int(counts[code]))
+
+# Prediction Cache
+# TKD_CACHE_SIZE=0 disables it; TKD_CACHE_KEY is 'exact' or 'forest' (see cache.py)
+CACHE_SIZE = int(os.environ.get('TKD_CACHE_SIZE', 10000))
+CACHE_TTL = float(os.environ.get('TKD_CACHE_TTL', 0)) or None
+CACHE_KEY_MODE = os.environ.get('TKD_CACHE_KEY', 'forest')
+# Calls scoring more rows than this (large /predict/batch requests) bypass the
+# cache: the per-row lookups cost more than they save, and a big batch would
+# evict the hot single-request profiles. The default keeps ASGI micro-batches cached.
+CACHE_MAX_ROWS = int(os.environ.get('TKD_CACHE_MAX_ROWS', 64))
+
 # Load Artifacts
-# Load Artifacts
-model = None
+# Prefer the flat forest export (plain NumPy arrays, no sklearn needed);
+# fall back to unpickling the sklearn model and flattening it here.
+ARTIFACTS_PATH = 'tkd_model_artifacts.pkl'
+FOREST_PATH = 'tkd_model_forest.npz'
+TABLE_PATH = 'tkd_model_table.npz'
+
+# 'forest' walks the flat forest; 'table' answers from the precomputed decision table
+INFERENCE_MODE = os.environ.get('TKD_INFERENCE', 'forest')
+
+# Hot reload: POST /admin/reload (needs TKD_ADMIN_TOKEN) and/or a per-worker
+# file watch that polls the artifacts every TKD_RELOAD_POLL seconds (0 = off)
+ADMIN_TOKEN = os.environ.get('TKD_ADMIN_TOKEN')
+RELOAD_POLL = float(os.environ.get('TKD_RELOAD_POLL', 0))
+
+class ModelState:
+    # Everything a request needs from one artifact version. Requests read the
+    # global `state` once and use only that object, and a reload replaces it
+    # with a single assignment, so a request never mixes two versions.
+    def __init__(self, model, pipeline, version, forest=None):
+        self.model = model
+        self.pipeline = pipeline
+        self.version = version
+        # Explanations need the trees even when the decision table serves predictions
+        self.forest = forest if forest is not None else model
+        self.cache_keys = make_key_function(model, CACHE_KEY_MODE)
+        # Cached predictions belong to one model, so each version gets its own cache
+        self.cache = PredictionCache(max_size=CACHE_SIZE, ttl=CACHE_TTL)
+        self.loaded_at = time.time()
+
+state = None
 load_error = None
-try:
-    artifacts = joblib.load('tkd_model_artifacts.pkl')
-    model = artifacts['model']
-    industry_map = artifacts['industry_map']
-    # industry_medians removed in V1.5
-    global_mean = artifacts['global_mean']
-    feature_cols = artifacts['features']
-    print(">>> Model and Artifacts Loaded Successfully")
-except Exception as e:
-    load_error = str(e)
-    print(f"CRITICAL ERROR: Could not load model: {e}")
+_reload_lock = threading.Lock()
+_artifact_stamp = None
+
+def artifact_stamp():
+    # mtimes of the artifact files; a change means a new model was shipped
+    return tuple(os.stat(p).st_mtime_ns if os.path.exists(p) else None
+                 for p in (FOREST_PATH, TABLE_PATH, ARTIFACTS_PATH))
+
+def check_model(forest, pipeline):
+    # The forest must only read columns the pipeline produces and predict known tiers
+    n_features = int(forest.feature.max()) + 1
+    if n_features > len(pipeline.features):
+        raise ValueError(f"Model splits on {n_features} features, pipeline produces {len(pipeline.features)}")
+    unknown = set(forest.classes_.tolist()) - set(CLASS_NAMES)
+    if unknown:
+        raise ValueError(f"Model predicts unknown tier codes {sorted(unknown)}")
+
+def warm_up(new_state):
+    # Score one row per known industry (plus the default) before going live:
+    # catches broken artifacts and builds the cache key tables off the request path
+    records = [{'employee_count': 100, 'years_active': 10, 'industry_type': k}
+               for k in sorted(new_state.pipeline.industry_map) + [DEFAULT_INDUSTRY]]
+    X, errors = new_state.pipeline.transform_records(records)
+    if any(errors):
+        raise ValueError(f"Warm-up rows failed feature engineering: {next(e for e in errors if e)}")
+    probabilities = new_state.model.predict_proba(X)
+    if not np.allclose(probabilities.sum(axis=1), 1.0):
+        raise ValueError('Warm-up predictions are not valid probability rows')
+    new_state.cache_keys(X)
+    new_state.forest.contributions  # exports without precomputed contributions build them here
+
+def build_state():
+    # Loads, checks and warms a new ModelState without touching the live one
+    if os.path.exists(FOREST_PATH):
+        forest, pipeline_dict = load_flat_forest(FOREST_PATH)
+        version = forest.version
+        pipeline = FeaturePipeline.from_dict(pipeline_dict)  # raises on a different feature list
+    else:
+        import joblib
+        artifacts = joblib.load(ARTIFACTS_PATH)
+        forest = FlatForest.from_model(artifacts['model'])
+        version = artifacts.get('version')
+        pipeline = FeaturePipeline.from_artifacts(artifacts)
+    check_model(forest, pipeline)
+
+    model = forest
+    if INFERENCE_MODE == 'table':
+        from decision_table import load_decision_table  # only needed in this mode
+        table = load_decision_table(TABLE_PATH) if os.path.exists(TABLE_PATH) else None
+        if table is not None and table.fingerprint == forest.fingerprint():
+            model = table
+        else:
+            log_event(log, logging.WARNING, 'decision_table_unusable', path=TABLE_PATH,
+                      detail='missing or built from a different forest; serving from the forest')
+
+    # Artifacts from before versioning are identified by their content hash
+    new_state = ModelState(model, pipeline, version or forest.fingerprint()[:12], forest)
+    warm_up(new_state)
+    return new_state
+
+def load_artifacts():
+    # (Re)load the model. On failure the previous version keeps serving.
+    global state, load_error, _artifact_stamp
+    with _reload_lock:
+        _artifact_stamp = artifact_stamp()
+        previous = state.version if state is not None else None
+        try:
+            new_state = build_state()
+        except Exception as e:
+            load_error = str(e)
+            RELOADS.inc('failed')
+            log.critical('model_load_failed', exc_info=True,
+                         extra={'fields': {'error': load_error, 'serving': previous}})
+            return False
+
+        state = new_state
+        load_error = None
+        RELOADS.inc('ok')
+        log_event(log, logging.INFO, 'model_loaded', version=new_state.version, previous=previous,
+                  inference=type(new_state.model).__name__, trees=new_state.model.n_estimators,
+                  cache_key=CACHE_KEY_MODE)
+        return True
+
+def _watch_artifacts():
+    seen = _artifact_stamp
+    while True:
+        time.sleep(RELOAD_POLL)
+        current = artifact_stamp()
+        if current != seen:
+            seen = current
+            log_event(log, logging.INFO, 'artifacts_changed', paths=[FOREST_PATH, TABLE_PATH, ARTIFACTS_PATH])
+            load_artifacts()
+
+_watcher_pid = None
+
+@app.before_request
+def start_artifact_watcher():
+    # Started lazily in each serving process: threads do not survive
+    # gunicorn's fork, and the watch must run in every worker
+    global _watcher_pid
+    if RELOAD_POLL > 0 and _watcher_pid != os.getpid():
+        _watcher_pid = os.getpid()
+        threading.Thread(target=_watch_artifacts, name='artifact-watcher', daemon=True).start()
+
+load_artifacts()
+
+def predict_proba_cached(current, X):
+    # Serve rows from the cache where possible; score all misses in one forest call
+    model, cache = current.model, current.cache
+    if cache.max_size <= 0 or len(X) > CACHE_MAX_ROWS:
+        return model.predict_proba(X)
+
+    keys = current.cache_keys(X)
+    probabilities = np.empty((len(X), len(model.classes_)), dtype=np.float64)
+    missing = []
+    for i, key in enumerate(keys):
+        cached = cache.get(key)
+        if cached is None:
+            missing.append(i)
+        else:
+            probabilities[i] = cached
+
+    if missing:
+        fresh = model.predict_proba(X[missing])
+        probabilities[missing] = fresh
+        for i, row in zip(missing, fresh):
+            cache.put(keys[i], row.copy())  # a view would keep all of `fresh` alive
+    return probabilities
+
+def score_features(current, X):
+    # Single forest traversal: the predicted class is the argmax of predict_proba,
+    # exactly as RandomForestClassifier.predict computes it.
+    # X columns must be in current.pipeline.features order.
+    if not np.isfinite(X).all():
+        raise ValueError('Input produces non-finite features (NaN or infinity)')
+    probabilities = predict_proba_cached(current, X)
+    return pick_tiers(current, probabilities) + (probabilities,)
+
+def pick_tiers(current, probabilities):
+    class_idx = probabilities.argmax(axis=1)
+    tier_codes = current.model.classes_[class_idx].astype(int)
+    confidences = probabilities[np.arange(len(class_idx)), class_idx]
+    return tier_codes, confidences
+
+# ---------------------------------------------------------
+# Explanations (?explain=1 on /predict and /predict/batch)
+# ---------------------------------------------------------
+# Tree-path decomposition of every tier probability (see FlatForest.explain):
+#   probabilities[c] = bias[c] + sum over features of contributions[feature][c]
+# bias is the forest's average before any split; a positive contribution means
+# the company's value for that feature pushed the tier up. The per-node sums are
+# precomputed in the export, so explaining a row costs one gather over its
+# leaves. Explained rows bypass the prediction cache (it stores no explanations).
+
+def wants_explanation():
+    return request.args.get('explain', '').lower() in ('1', 'true', 'yes')
+
+def explain_features(current, X):
+    # score_features plus contributions (n_rows, n_features, n_classes)
+    if not np.isfinite(X).all():
+        raise ValueError('Input produces non-finite features (NaN or infinity)')
+    probabilities, contributions = current.forest.explain(X)
+    missing = len(current.pipeline.features) - contributions.shape[1]
+    if missing > 0:  # features no tree splits on (older exports) contribute nothing
+        contributions = np.pad(contributions, ((0, 0), (0, missing), (0, 0)))
+    return pick_tiers(current, probabilities) + (probabilities, contributions)
+
+def explanation(current, contributions):
+    # One row's contributions -> {'bias': [...], 'contributions': {feature: [...]}}, per-tier
+    # lists in the same order as 'probabilities'
+    return {
+        'bias': current.forest.bias.tolist(),
+        'contributions': dict(zip(current.pipeline.features, contributions.tolist()))
+    }
+
+def finish_request(endpoint, start, timings, body, status=200, payload=None, error=None, **fields):
+    # Records the request latency and error counters and writes the log line:
+    # always for errors, for a sample of the successful requests (see request_log.py)
+    if not isinstance(body, Response):
+        body = jsonify(body)
+    elapsed = time.perf_counter() - start
+    REQUEST_SECONDS.observe(elapsed, endpoint)
+    failed = status >= 400
+    if failed:
+        ERRORS.inc(endpoint, str(status))
+    if not (failed or sampled()):
+        return body, status
+
+    fields.update(endpoint=endpoint, status=status, ms=round(elapsed * 1000, 4),
+                  stages={k: round(v * 1000, 4) for k, v in timings.items()}, payload=payload)
+    if failed:
+        # Unexpected exceptions get a traceback; bad input does not
+        unexpected = error is not None and not isinstance(error, (ValueError, HTTPException))
+        log_event(log, logging.WARNING, 'request_failed', exc_info=error if unexpected else None,
+                  error=str(error) if error else body.get_json().get('error'), **fields)
+    else:
+        log_event(log, logging.INFO, 'request', **fields)
+    return body, status
 
 @app.route('/predict', methods=['POST'])
 def predict():
-    if model is None:
-        return jsonify({'error': 'Model not loaded', 'details': load_error}), 503
+    start = time.perf_counter()
+    timings = {}
+    REQUESTS.inc('predict')
+    current = state  # one model version for the whole request, even if a reload lands meanwhile
+    if current is None:
+        return finish_request('predict', start, timings, {'error': 'Model not loaded', 'details': load_error}, 503)
 
+    data = None
     try:
-        data = request.json
-        print("Received Data:", data)
+        with stage('predict', 'parse', timings):
+            data = request.json
         
         # Expecting:
         # employee_count (int)
@@ -42,77 +341,308 @@ def predict():
         # business_type (int) (0 or 1)
         # is_subsidiary (int) (0 or 1)
         
-        # 1. Feature Engineering (Replicate training logic)
-        
-        # Log Transforms
-        emp_count = float(data.get('employee_count', 0))
-        years = float(data.get('years_active', 0))
-        
-        log_emp = np.log1p(emp_count)
-        log_years = np.log1p(years)
-        
-        # Governance Score
-        esg = int(data.get('esg_content', 0))
-        un_global = int(data.get('un_global', 0))
-        public = int(data.get('publicly_traded', 0))
-        
-        gov_score = esg + un_global + public
-        
-        # Interaction
-        size_x_gov = log_emp * (gov_score + 1)
-        
-        # Industry Encoding
-        # Since industry map keys are integers (from encoded analysis), we might have a disconnect if UI sends strings.
-        # Wait, in train_model.py we encoded 'Industry Type' using LabelEncoder in previous steps?
-        # NO, in train_model.py we loaded the excel where 'Industry Type' was ALREADY encoded as 0,1,2.. in Phase 2 data?
-        # Let's check `analyze_data.py` output: "Industry Type (7 unique): int64" 
-        # So the input MUST be the integer code for Industry.
-        
-    # Industry Encoding
-        # Industry Map keys are Strings (e.g., 'RETAIL_CONSUMER')
-        industry_key = str(data.get('industry_type', 'RETAIL_CONSUMER')) 
-        
-        # Look up mean value
-        val = industry_map.get(industry_key)
-        if val is None:
-            print(f"Warning: Industry '{industry_key}' not found in map. Using global mean.")
-            industry_encoded = global_mean
-        else:
-            industry_encoded = val
-        
-        # Construct Feature Vector
-        # Order: Log_Employee, Log_Years, Governance_Score, Size_x_Gov, Industry_Target_Encoded, Business Type, Is Subsidiary
-        features = [
-            log_emp,
-            log_years,
-            gov_score,
-            size_x_gov,
-            industry_encoded,
-            int(data.get('business_type', 0)),
-            int(data.get('is_subsidiary', 0))
-        ]
-        
-        # Predict
-        features_arr = np.array([features])
-        prediction_class = model.predict(features_arr)[0]
-        probabilities = model.predict_proba(features_arr)[0]
-        confidence = max(probabilities)
-        
-        # Map Class to Name
-        # 1: Believe, 2: Inspire, 3: Dream, 4: Hope, 5: Vision
-        class_names = {1: 'Believe', 2: 'Inspire', 3: 'Dream', 4: 'Hope', 5: 'Vision'}
-        result_name = class_names.get(prediction_class, "Unknown")
-        
-        return jsonify({
-            'tier': result_name,
-            'tier_code': int(prediction_class),
-            'confidence': float(confidence),
-            'probabilities': probabilities.tolist()
-        })
+        # 1. Feature Engineering (shared pipeline, same code as training)
+        with stage('predict', 'features', timings):
+            X, errors = current.pipeline.transform_records([data])
+            if errors[0] is not None:
+                raise ValueError(errors[0])
+            count_unknown_industries(current.pipeline, [str(data.get('industry_type', DEFAULT_INDUSTRY))])
+
+        # Predict (one forest pass gives class, confidence and probabilities)
+        explain = wants_explanation()
+        with stage('predict', 'inference', timings):
+            if explain:
+                tier_codes, confidences, probabilities, contributions = explain_features(current, X)
+            else:
+                tier_codes, confidences, probabilities = score_features(current, X)
+        count_predictions(tier_codes)
+        prediction_class = tier_codes[0]
+
+        with stage('predict', 'serialize', timings):
+            body = {
+                'tier': CLASS_NAMES.get(prediction_class, "Unknown"),
+                'tier_code': int(prediction_class),
+                'confidence': float(confidences[0]),
+                'probabilities': probabilities[0].tolist(),
+                'model_version': current.version
+            }
+            if explain:
+                body['explanation'] = explanation(current, contributions[0])
+            response = jsonify(body)
+        return finish_request('predict', start, timings, response, payload=data, model_version=current.version)
 
     except Exception as e:
-        print(f"Error predicting: {e}")
-        return jsonify({'error': str(e)}), 500
+        return finish_request('predict', start, timings, {'error': str(e)}, 500, payload=data, error=e,
+                              model_version=current.version)
+
+# ---------------------------------------------------------
+# Batch Scoring
+# ---------------------------------------------------------
+MAX_BATCH_SIZE = int(os.environ.get('TKD_MAX_BATCH_SIZE', 100000))
+
+def _parse_batch_body():
+    # Accepts a JSON array, a JSON object with a 'records' array, or NDJSON (one object per line).
+    # Returns the list of records and a dict of {row index: parse error} for NDJSON lines that failed.
+    parse_errors = {}
+    if request.is_json and not request.mimetype.endswith('ndjson'):
+        body = request.get_json()
+        if isinstance(body, dict):
+            body = body.get('records')
+        if not isinstance(body, list):
+            raise ValueError("Expected a JSON array of records (or {'records': [...]})")
+        return body, parse_errors
+
+    records = []
+    for line in request.get_data(as_text=True).splitlines():
+        if not line.strip():
+            continue
+        try:
+            records.append(json.loads(line))
+        except ValueError as e:
+            parse_errors[len(records)] = f'Invalid JSON: {e}'
+            records.append(None)
+    return records, parse_errors
+
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch():
+    start = time.perf_counter()
+    timings = {}
+    REQUESTS.inc('batch')
+    current = state  # one model version for the whole request, even if a reload lands meanwhile
+    if current is None:
+        return finish_request('batch', start, timings, {'error': 'Model not loaded', 'details': load_error}, 503)
+
+    try:
+        with stage('batch', 'parse', timings):
+            records, parse_errors = _parse_batch_body()
+    except Exception as e:
+        return finish_request('batch', start, timings, {'error': str(e)}, 400, error=e)
+
+    if len(records) > MAX_BATCH_SIZE:
+        return finish_request('batch', start, timings,
+                              {'error': f'Batch too large ({len(records)} > {MAX_BATCH_SIZE})'}, 413)
+
+    try:
+        with stage('batch', 'features', timings):
+            X, errors = current.pipeline.transform_records(records)
+            for i, msg in parse_errors.items():
+                errors[i] = msg
+
+            ok = np.array([e is None for e in errors], dtype=bool)
+            count_unknown_industries(current.pipeline, [str(records[i].get('industry_type', DEFAULT_INDUSTRY))
+                                                        for i in np.flatnonzero(ok)])
+        results = [{'error': e} for e in errors]
+
+        if ok.any():
+            # One forest call over every valid row
+            explain = wants_explanation()
+            with stage('batch', 'inference', timings):
+                if explain:
+                    tier_codes, confidences, probabilities, contributions = explain_features(current, X[ok])
+                else:
+                    tier_codes, confidences, probabilities = score_features(current, X[ok])
+            count_predictions(tier_codes)
+
+            for j, (i, code, conf, proba) in enumerate(zip(np.flatnonzero(ok), tier_codes.tolist(),
+                                                           confidences.tolist(), probabilities.tolist())):
+                results[i] = {
+                    'tier': CLASS_NAMES.get(code, "Unknown"),
+                    'tier_code': code,
+                    'confidence': conf,
+                    'probabilities': proba
+                }
+                if explain:
+                    results[i]['explanation'] = explanation(current, contributions[j])
+
+        n_errors = int((~ok).sum())
+        BATCH_ROWS.inc('ok', amount=len(records) - n_errors)
+        BATCH_ROWS.inc('error', amount=n_errors)
+        with stage('batch', 'serialize', timings):
+            response = jsonify({
+                'count': len(results),
+                'errors': n_errors,
+                'model_version': current.version,
+                'results': results
+            })
+        return finish_request('batch', start, timings, response, rows=len(records), row_errors=n_errors,
+                              model_version=current.version)
+
+    except Exception as e:
+        return finish_request('batch', start, timings, {'error': str(e)}, 500, error=e, rows=len(records),
+                              model_version=current.version)
+
+# ---------------------------------------------------------
+# What-If Sensitivity Grid
+# ---------------------------------------------------------
+# POST /predict/sensitivity
+#   {"base": {...company...},
+#    "vary": {"employee_count": {"from": 500, "to": 10000, "steps": 20, "scale": "log"},
+#             "publicly_traded": "toggle", "industry_type": ["FINANCE", "TECH_TELECOM"]},
+#    "probabilities": false}
+# The grid (cartesian product of "vary", see sensitivity.py) is scored in one
+# forest pass together with the base company. Grids are laid out in C order
+# over "axes": tier_codes[i][j] is axes[0].values[i] x axes[1].values[j].
+# Hypothetical rows bypass the prediction cache (they would evict real traffic)
+# and are not counted in tkd_predictions_total.
+MAX_GRID_SIZE = int(os.environ.get('TKD_MAX_GRID_SIZE', 10000))
+
+@app.route('/predict/sensitivity', methods=['POST'])
+def predict_sensitivity():
+    start = time.perf_counter()
+    timings = {}
+    REQUESTS.inc('sensitivity')
+    current = state
+    if current is None:
+        return finish_request('sensitivity', start, timings, {'error': 'Model not loaded', 'details': load_error}, 503)
+
+    data = None
+    try:
+        with stage('sensitivity', 'parse', timings):
+            data = request.get_json()
+            if not isinstance(data, dict):
+                raise ValueError("Expected a JSON object with 'base' and 'vary'")
+            base = data.get('base', {})
+            if not isinstance(base, dict):
+                raise ValueError("'base' must be a JSON object")
+            axes = parse_axes(data.get('vary'))
+    except Exception as e:
+        return finish_request('sensitivity', start, timings, {'error': str(e)}, 400, payload=data, error=e)
+
+    n = grid_size(axes)
+    if n > MAX_GRID_SIZE:
+        return finish_request('sensitivity', start, timings,
+                              {'error': f'Grid too large ({n} > {MAX_GRID_SIZE} points)'}, 413, payload=data)
+
+    try:
+        with stage('sensitivity', 'features', timings):
+            X_base, errors = current.pipeline.transform_records([base])
+            if errors[0] is not None:
+                raise ValueError(f'base: {errors[0]}')
+            columns, n = expand_grid(base, axes)
+            X_grid, errors = current.pipeline.transform_columns(columns, n)
+            bad = next((i for i, e in enumerate(errors) if e is not None), None)
+            if bad is not None:
+                point = {field: columns[field][bad] for field, _ in axes}
+                raise ValueError(f'Grid point {point}: {errors[bad]}')
+            count_unknown_industries(current.pipeline, set(map(str, columns[INDUSTRY_FIELD])))
+
+        # One forest pass: base company first, then the grid
+        with stage('sensitivity', 'inference', timings):
+            probabilities = current.model.predict_proba(np.vstack([X_base, X_grid]))
+            tier_codes, confidences = pick_tiers(current, probabilities)
+
+        with stage('sensitivity', 'serialize', timings):
+            shape = [len(values) for _, values in axes]
+            body = {
+                'model_version': current.version,
+                'base': {
+                    'tier': CLASS_NAMES.get(int(tier_codes[0]), "Unknown"),
+                    'tier_code': int(tier_codes[0]),
+                    'confidence': float(confidences[0]),
+                    'probabilities': probabilities[0].tolist()
+                },
+                'axes': [{'field': field, 'values': values} for field, values in axes],
+                'shape': shape,
+                'tiers': {int(code): CLASS_NAMES.get(int(code), "Unknown") for code in current.model.classes_},
+                'tier_codes': tier_codes[1:].reshape(shape).tolist(),
+                'confidence': np.round(confidences[1:], 4).reshape(shape).tolist()
+            }
+            if data.get('probabilities'):
+                body['probabilities'] = np.round(probabilities[1:], 4).reshape(shape + [probabilities.shape[1]]).tolist()
+            response = jsonify(body)
+        return finish_request('sensitivity', start, timings, response, payload=data, points=n,
+                              model_version=current.version)
+
+    except ValueError as e:
+        return finish_request('sensitivity', start, timings, {'error': str(e)}, 400, payload=data, error=e,
+                              model_version=current.version)
+    except Exception as e:
+        return finish_request('sensitivity', start, timings, {'error': str(e)}, 500, payload=data, error=e,
+                              model_version=current.version)
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    current = state
+    if current is None:
+        return jsonify({'error': 'Model not loaded', 'details': load_error}), 503
+    stats = current.cache.stats()
+    stats['key_mode'] = CACHE_KEY_MODE
+    stats['model_version'] = current.version
+    return jsonify(stats)
+
+# ---------------------------------------------------------
+# Health / Readiness
+# ---------------------------------------------------------
+# /health: the process is up (liveness). /ready: a model is loaded and answers
+# a real prediction (readiness probe; routes no traffic to a cold worker).
+READY_RECORD = {'employee_count': 500, 'years_active': 20, 'industry_type': DEFAULT_INDUSTRY}
+
+@app.route('/health', methods=['GET'])
+def health():
+    return jsonify({'status': 'ok'})
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    current = state
+    if current is None:
+        return jsonify({'ready': False, 'error': load_error}), 503
+    start = time.perf_counter()
+    try:
+        # Straight to the model (not the cache), so the probe exercises inference
+        X, errors = current.pipeline.transform_records([READY_RECORD])
+        probabilities = current.model.predict_proba(X)
+        if errors[0] is not None or not np.isfinite(probabilities).all():
+            raise ValueError(errors[0] or 'Warm-up prediction is not finite')
+    except Exception as e:
+        return jsonify({'ready': False, 'error': str(e), 'model_version': current.version}), 503
+    return jsonify({
+        'ready': True,
+        'model_version': current.version,
+        'warmup_ms': round((time.perf_counter() - start) * 1000, 3)
+    })
+
+# ---------------------------------------------------------
+# Model Version / Hot Reload
+# ---------------------------------------------------------
+@app.route('/model', methods=['GET'])
+def model_info():
+    current = state
+    if current is None:
+        return jsonify({'error': 'Model not loaded', 'details': load_error}), 503
+    return jsonify({
+        'model_version': current.version,
+        'loaded_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(current.loaded_at)),
+        'inference': type(current.model).__name__,
+        'trees': current.model.n_estimators,
+        'features': current.pipeline.features,
+        'last_reload_error': load_error,
+        'worker': os.getpid()
+    })
+
+@app.route('/admin/reload', methods=['POST'])
+def admin_reload():
+    # Reloads the artifacts in this process (with several gunicorn workers, prefer
+    # TKD_RELOAD_POLL: every worker watches the files itself).
+    # ?wait=1 answers after the swap; otherwise the load runs in the background.
+    if not ADMIN_TOKEN:
+        return jsonify({'error': 'Reload endpoint disabled (set TKD_ADMIN_TOKEN)'}), 404
+    # Compared as bytes: compare_digest() raises TypeError on non-ASCII str
+    supplied = request.headers.get('Authorization', '').encode('utf-8')
+    if not hmac.compare_digest(supplied, f'Bearer {ADMIN_TOKEN}'.encode('utf-8')):
+        return jsonify({'error': 'Unauthorized'}), 401, {'WWW-Authenticate': 'Bearer'}
+
+    if request.args.get('wait'):
+        ok = load_artifacts()
+        body = {'status': 'loaded' if ok else 'failed', 'error': load_error,
+                'model_version': state.version if state is not None else None}
+        return jsonify(body), 200 if ok else 500
+
+    threading.Thread(target=load_artifacts, name='artifact-reload', daemon=True).start()
+    return jsonify({'status': 'reloading', 'model_version': state.version if state is not None else None}), 202
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 if __name__ == '__main__':
     app.run(port=5328) # Use a custom port to avoid conflicts
@@ -0,0 +1,222 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import numpy as np
+from uvicorn.middleware.wsgi import WSGIMiddleware
+
+import app as flask_app
+from app import (REQUESTS, ERRORS, REQUEST_SECONDS, STAGE_SECONDS, metrics, log,
+                 count_unknown_industries, count_predictions, score_features)
+from features import CLASS_NAMES, DEFAULT_INDUSTRY
+from request_log import log_event, sampled
+
+# ---------------------------------------------------------
+# Async Serving Mode with Micro-Batching (ASGI)
+# ---------------------------------------------------------
+# Same model, same responses as the Flask app, but POST /predict requests are
+# queued and scored together: the first request of a batch opens a window of
+# TKD_BATCH_WINDOW_MS (default 2 ms); everything that arrives meanwhile (up to
+# TKD_BATCH_MAX_SIZE rows, default 64) goes through one feature-pipeline call
+# and one forest call, and each caller gets its own row back. The window is an
+# upper bound: once every /predict request in flight has joined the batch it
+# is flushed right away, so a lone client does not wait for it. A window of 0
+# still merges the requests that arrive in the same event-loop iteration.
+# Every other route is served by the Flask app (WSGI bridge), and so are
+# /predict requests whose body is not a JSON object (the body already read is
+# replayed), so their error responses are Flask's own.
+#
+#   cd backend && gunicorn -c gunicorn.conf.py -k uvicorn.workers.UvicornWorker asgi_app:app
+#   cd backend && uvicorn asgi_app:app --port 5329           (single process, development)
+#
+# Prefer gunicorn over `uvicorn --workers N`: uvicorn's own multi-process
+# socket does not get TCP_NODELAY, which costs ~40 ms per keep-alive request
+# (Nagle + delayed ACK); gunicorn sets it and also preloads the model (gunicorn.conf.py).
+#
+# Model loading, hot reload, the prediction cache, metrics and logging are the
+# Flask app's (imported from app.py).
+
+BATCH_WINDOW = float(os.environ.get('TKD_BATCH_WINDOW_MS', 2)) / 1000
+BATCH_MAX_SIZE = int(os.environ.get('TKD_BATCH_MAX_SIZE', 64))
+
+BATCH_SIZE = metrics.histogram('tkd_microbatch_size', 'Rows per micro-batch (ASGI /predict)',
+                               buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+
+def score_records(records):
+    # One pipeline call and one forest call for the whole batch.
+    # Returns a (status, body) pair per record, bodies as in the Flask /predict.
+    current = flask_app.state  # one model version per batch, even if a reload lands meanwhile
+    if current is None:
+        return [(503, {'error': 'Model not loaded', 'details': flask_app.load_error})] * len(records)
+
+    timings = {}
+    start = time.perf_counter()
+    X, errors = current.pipeline.transform_records(records)
+    ok = np.array([e is None for e in errors], dtype=bool)
+    count_unknown_industries(current.pipeline, [str(records[i].get('industry_type', DEFAULT_INDUSTRY))
+                                                for i in np.flatnonzero(ok)])
+    timings['features'] = time.perf_counter() - start
+
+    results = [(500, {'error': e}) for e in errors]
+    if ok.any():
+        start = time.perf_counter()
+        tier_codes, confidences, probabilities = score_features(current, X[ok])
+        timings['inference'] = time.perf_counter() - start
+        count_predictions(tier_codes)
+
+        for i, code, conf, proba in zip(np.flatnonzero(ok), tier_codes.tolist(),
+                                        confidences.tolist(), probabilities.tolist()):
+            results[i] = (200, {
+                'tier': CLASS_NAMES.get(code, "Unknown"),
+                'tier_code': code,
+                'confidence': conf,
+                'probabilities': proba,
+                'model_version': current.version
+            })
+
+    for name, elapsed in timings.items():
+        STAGE_SECONDS.observe(elapsed, 'microbatch', name)
+    BATCH_SIZE.observe(len(records))
+    return results
+
+class MicroBatcher:
+    # Collects records from concurrent requests; flushes when the window closes
+    # or the batch is full. Runs on the event loop: scoring is CPU-bound and
+    # short, so it runs inline between network reads rather than in a thread.
+    def __init__(self, score, window=BATCH_WINDOW, max_size=BATCH_MAX_SIZE):
+        self.score = score
+        self.window = window
+        self.max_size = max_size
+        self.pending = []  # (record, future)
+        self.timer = None
+        self.in_flight = 0  # /predict requests between arrival and answer (maintained by predict())
+
+    async def submit(self, record):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((record, future))
+        if len(self.pending) >= self.max_size:
+            self.flush()
+        elif len(self.pending) >= self.in_flight:
+            # Nobody else to wait for; call_soon still lets tasks already
+            # scheduled in this loop iteration join first
+            if self.timer is not None:
+                self.timer.cancel()
+            self.timer = loop.call_soon(self.flush)
+        elif self.timer is None:
+            self.timer = loop.call_later(self.window, self.flush)
+        return await future
+
+    def flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        batch, self.pending = self.pending, []
+        if not batch:
+            return
+        try:
+            results = self.score([record for record, _ in batch])
+        except Exception as e:
+            log_event(log, logging.ERROR, 'microbatch_failed', exc_info=e, rows=len(batch))
+            results = [(500, {'error': str(e)})] * len(batch)
+        for (_, future), result in zip(batch, results):
+            if not future.done():  # the client may have gone away
+                future.set_result(result)
+
+batcher = MicroBatcher(score_records)
+wsgi = WSGIMiddleware(flask_app.app)
+
+# ---------------------------------------------------------
+# ASGI Application
+# ---------------------------------------------------------
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+def replay(body, receive):
+    # receive() for the WSGI bridge: the body read here first, then the client's own messages
+    sent = False
+    async def receive_again():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+        return await receive()
+    return receive_again
+
+def parse_record(scope, body):
+    # The JSON object to score, or None when Flask's request.json would not give one
+    content_type = dict(scope.get('headers', ())).get(b'content-type', b'').decode('latin-1')
+    mimetype = content_type.split(';')[0].strip().lower()
+    if not (mimetype == 'application/json' or (mimetype.startswith('application/') and mimetype.endswith('+json'))):
+        return None
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+async def send_json(send, status, body):
+    data = json.dumps(body).encode()
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(data)).encode()),
+            (b'access-control-allow-origin', b'*'),  # as flask-cors does for the Flask app
+        ],
+    })
+    await send({'type': 'http.response.body', 'body': data})
+
+async def predict(scope, receive, send):
+    start = time.perf_counter()
+    batcher.in_flight += 1
+    try:
+        raw = await read_body(receive)
+        data = parse_record(scope, raw)
+        if data is not None:
+            status, body = await batcher.submit(data)
+    finally:
+        batcher.in_flight -= 1
+    if data is None:
+        # Malformed, non-object or non-JSON body: Flask answers (and counts) it
+        await wsgi(scope, replay(raw, receive), send)
+        return
+
+    REQUESTS.inc('predict')
+    elapsed = time.perf_counter() - start
+    REQUEST_SECONDS.observe(elapsed, 'predict')
+    if status >= 400:
+        ERRORS.inc('predict', str(status))
+        log_event(log, logging.WARNING, 'request_failed', error=body.get('error'), endpoint='predict',
+                  status=status, ms=round(elapsed * 1000, 4), payload=data)
+    elif sampled():
+        log_event(log, logging.INFO, 'request', endpoint='predict', status=status, ms=round(elapsed * 1000, 4),
+                  payload=data, model_version=body.get('model_version'))
+    await send_json(send, status, body)
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            flask_app.start_artifact_watcher()  # TKD_RELOAD_POLL, as in every Flask worker
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            batcher.flush()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+    elif (scope['type'] == 'http' and scope['path'] == '/predict' and scope['method'] == 'POST'
+          and not scope.get('query_string')):  # ?explain=1 and friends: Flask handles them
+        await predict(scope, receive, send)
+    else:
+        await wsgi(scope, receive, send)
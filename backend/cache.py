@@ -0,0 +1,94 @@
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+# ---------------------------------------------------------
+# Prediction Cache (bounded LRU with optional TTL)
+# ---------------------------------------------------------
+# Keys are canonicalized feature vectors, values are probability rows.
+# Two key modes:
+#   'exact'  - the float32 feature vector the forest actually compares
+#   'forest' - per feature, the interval between the forest's split thresholds
+#              the value falls in. Every input inside the same cell reaches the
+#              same leaf in every tree, so bucketing this way can never change
+#              the prediction.
+
+class PredictionCache:
+    def __init__(self, max_size=10000, ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if self.max_size <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+def make_key_function(forest, mode='exact'):
+    # Returns keys(X) -> one hashable key per row of the feature matrix.
+    # forest is anything with split_thresholds() (FlatForest, DecisionTable)
+    if mode == 'exact':
+        def keys(X):
+            X32 = np.ascontiguousarray(X, dtype=np.float32)
+            return [row.tobytes() for row in X32]
+        return keys
+
+    if mode == 'forest':
+        thresholds = forest.split_thresholds()
+        def keys(X):
+            # Compare exactly as the trees do: float32 value against float64 threshold
+            X64 = np.asarray(X, dtype=np.float32).astype(np.float64)
+            cells = np.empty(X64.shape, dtype=np.int32)
+            for f in range(X64.shape[1]):
+                t = thresholds[f] if f < len(thresholds) else np.empty(0)
+                cells[:, f] = np.searchsorted(t, X64[:, f], side='left')
+            return [row.tobytes() for row in cells]
+        return keys
+
+    raise ValueError(f"Unknown cache key mode '{mode}' (expected 'exact' or 'forest')")
@@ -0,0 +1,142 @@
+import numpy as np
+from forest import save_atomic
+
+# ---------------------------------------------------------
+# Precomputed Decision Table
+# ---------------------------------------------------------
+# The forest's output is piecewise constant: per feature, only the interval
+# between consecutive split thresholds ("cell") matters. Enumerating the full
+# product of cells is not compact for this forest (~700 employee x ~360 years
+# cells for every industry/governance/type/subsidiary combination, i.e. ~1e8
+# probability rows), so the table is factorized per feature instead:
+#
+#   masks[f][cell, tree]  bitset of the leaves of `tree` still reachable when
+#                         feature f falls in `cell`
+#   leaf_value[tree, leaf] class distribution of each leaf
+#
+# A lookup is one binary search per feature, one AND of the bitsets, and an
+# array index into leaf_value. No trees are walked at serving time and the
+# probabilities are identical to the forest's.
+
+WORD_BITS = 64
+ROW_BLOCK = 256  # rows per lookup block (bounds the (rows x trees x words) bitsets)
+
+def _leaf_ranges(forest, root):
+    # DFS over one tree of a FlatForest. Returns its leaves in left-to-right
+    # order and, for every internal node, the [start, mid, end) leaf range of
+    # its left and right subtree.
+    leaves = []
+    ranges = {}
+
+    def visit(node):
+        left, right = forest.children[2 * node], forest.children[2 * node + 1]
+        if left == node:
+            leaves.append(node)
+            return
+        start = len(leaves)
+        visit(left)
+        mid = len(leaves)
+        visit(right)
+        ranges[node] = (start, mid, len(leaves))
+
+    visit(root)
+    return leaves, ranges
+
+def _range_mask(start, end, n_words):
+    # Bitset (n_words uint64) with bits [start, end) set
+    mask = np.zeros(n_words, dtype=np.uint64)
+    for bit in range(start, end):
+        mask[bit // WORD_BITS] |= np.uint64(1) << np.uint64(bit % WORD_BITS)
+    return mask
+
+def build_decision_table(forest):
+    thresholds = forest.split_thresholds()
+    n_trees = forest.n_estimators
+    n_classes = len(forest.classes_)
+
+    trees = [_leaf_ranges(forest, root) for root in forest.roots]
+    max_leaves = max(len(leaves) for leaves, _ in trees)
+    n_words = -(-max_leaves // WORD_BITS)
+
+    leaf_value = np.zeros((n_trees, max_leaves, n_classes), dtype=np.float64)
+    masks = []
+    for t_list in thresholds:
+        masks.append(np.zeros((len(t_list) + 1, n_trees, n_words), dtype=np.uint64))
+
+    for t, (leaves, ranges) in enumerate(trees):
+        leaf_value[t, :len(leaves)] = forest.value[leaves]
+
+        # Every cell starts with all of the tree's leaves reachable
+        all_leaves = _range_mask(0, len(leaves), n_words)
+        for m in masks:
+            m[:, t] = all_leaves
+
+        for node, (start, mid, end) in ranges.items():
+            f = forest.feature[node]
+            # Cell c holds values with exactly c thresholds below them, so
+            # x <= threshold[k] (go left) holds for cells 0..k
+            k = np.searchsorted(thresholds[f], forest.threshold[node])
+            masks[f][k + 1:, t] &= ~_range_mask(start, mid, n_words)
+            masks[f][:k + 1, t] &= ~_range_mask(mid, end, n_words)
+
+    arrays = {
+        'leaf_value': leaf_value,
+        'classes': forest.classes_,
+        'fingerprint': np.array(forest.fingerprint()),
+    }
+    for f, (t_list, m) in enumerate(zip(thresholds, masks)):
+        arrays[f'thresholds_{f}'] = t_list
+        arrays[f'masks_{f}'] = m
+    return arrays
+
+class DecisionTable:
+    def __init__(self, arrays):
+        n_features = sum(1 for k in arrays if k.startswith('thresholds_'))
+        self.thresholds = [arrays[f'thresholds_{f}'] for f in range(n_features)]
+        self.masks = [arrays[f'masks_{f}'] for f in range(n_features)]
+        self.leaf_value = arrays['leaf_value']
+        self.classes_ = arrays['classes']
+        self.n_estimators = len(self.leaf_value)
+        self.fingerprint = str(arrays['fingerprint'])
+
+    @classmethod
+    def from_forest(cls, forest):
+        return cls(build_decision_table(forest))
+
+    def split_thresholds(self):
+        return self.thresholds
+
+    def apply(self, X):
+        # Leaf index (within its tree) reached by every row: shape (n_trees, n_rows)
+        X64 = np.asarray(X, dtype=np.float32).astype(np.float64)
+        reachable = None
+        for f, (t_list, m) in enumerate(zip(self.thresholds, self.masks)):
+            cells = np.searchsorted(t_list, X64[:, f], side='left')
+            reachable = m[cells] if reachable is None else reachable & m[cells]
+
+        # Exactly one bit is left per (row, tree): locate its word, then its bit
+        word_idx = (reachable != 0).argmax(axis=2)
+        word = np.take_along_axis(reachable, word_idx[:, :, np.newaxis], axis=2)[:, :, 0]
+        bit = np.frexp(word.astype(np.float64))[1] - 1
+        return (word_idx * WORD_BITS + bit).T
+
+    def predict_proba(self, X):
+        X = np.asarray(X)
+        proba = np.zeros((len(X), len(self.classes_)), dtype=np.float64)
+        tree_idx = np.arange(self.n_estimators)[:, np.newaxis]
+        for start in range(0, len(X), ROW_BLOCK):
+            leaves = self.apply(X[start:start + ROW_BLOCK])
+            # Trees are summed in estimator order, like the forest
+            proba[start:start + ROW_BLOCK] = self.leaf_value[tree_idx, leaves].sum(axis=0)
+        proba /= self.n_estimators
+        return proba
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+def save_decision_table(path, forest):
+    save_atomic(path, np.savez_compressed, **build_decision_table(forest))
+
+def load_decision_table(path):
+    with np.load(path, allow_pickle=False) as data:
+        return DecisionTable({k: data[k] for k in data.files})
@@ -0,0 +1,186 @@
+import numpy as np
+
+# ---------------------------------------------------------
+# Shared Feature Pipeline (training + serving)
+# ---------------------------------------------------------
+# Turns raw company inputs (API field names) into the model's feature matrix,
+# whole columns at a time. Works on a list of JSON records or on any mapping
+# of column name -> array (e.g. a pandas DataFrame or one of its chunks).
+#
+# The pipeline is fitted once in train_model.py (imputation medians, industry
+# target encoding) and stored in the artifact as a plain dict, so the server
+# and the training script run exactly the same arithmetic.
+
+# Model input columns, in the order the forest was trained on
+FEATURE_COLUMNS = [
+    'Log_Employee', 'Log_Years',
+    'Governance_Score', 'Size_x_Gov',
+    'Industry_Target_Encoded',
+    'Business Type', 'Is Subsidiary'
+]
+
+# (request key, default) for every numeric input
+NUMERIC_FIELDS = [
+    ('employee_count', 0),
+    ('years_active', 0),
+    ('esg_content', 0),
+    ('un_global', 0),
+    ('publicly_traded', 0),
+    ('business_type', 0),
+    ('is_subsidiary', 0),
+]
+INDUSTRY_FIELD = 'industry_type'
+DEFAULT_INDUSTRY = 'RETAIL_CONSUMER'
+INPUT_FIELDS = [key for key, _ in NUMERIC_FIELDS] + [INDUSTRY_FIELD]
+
+# Fields whose nulls are filled with the training median / with 0
+MEDIAN_FIELDS = ['employee_count', 'years_active']
+ZERO_FILL_FIELDS = ['esg_content', 'un_global', 'publicly_traded']
+
+# Phase 2 workbook headers -> API field names
+WORKBOOK_COLUMNS = {
+    'Industry Type': 'industry_type',
+    'Employee Count': 'employee_count',
+    'Years Active': 'years_active',
+    'ESG Content': 'esg_content',
+    'UN Global Impact': 'un_global',
+    'Publicly Traded': 'publicly_traded',
+    'Business Type': 'business_type',
+    'Is Subsidiary': 'is_subsidiary',
+}
+
+# 1: Believe, 2: Inspire, 3: Dream, 4: Hope, 5: Vision
+CLASS_NAMES = {1: 'Believe', 2: 'Inspire', 3: 'Dream', 4: 'Hope', 5: 'Vision'}
+
+def _numeric_column(values, key, errors, n):
+    # Fast path: the whole column converts in one call (None becomes NaN) to one value per row.
+    # Slow path (some value is bad, e.g. a list): convert row by row and record the failures.
+    try:
+        col = np.asarray(values, dtype=np.float64)
+        if col.ndim == 1 and len(col) == n:
+            return col
+    except (TypeError, ValueError):
+        pass
+    col = np.zeros(n, dtype=np.float64)
+    for i, v in enumerate(values):
+        try:
+            if np.ndim(v) != 0:
+                raise TypeError
+            col[i] = np.nan if v is None else float(v)
+        except (TypeError, ValueError):
+            if errors[i] is None:
+                errors[i] = f"Invalid value for '{key}': {v!r}"
+    return col
+
+class FeaturePipeline:
+    def __init__(self, industry_map, global_mean, medians=None, features=None):
+        self.industry_map = dict(industry_map)
+        self.global_mean = float(global_mean)
+        # Artifacts from before the shared pipeline have no medians; nulls then stay errors
+        self.medians = dict(medians or {})
+        self.features = list(features or FEATURE_COLUMNS)
+        if self.features != FEATURE_COLUMNS:
+            raise ValueError(f"Artifact expects features {self.features}, pipeline produces {FEATURE_COLUMNS}")
+
+    @classmethod
+    def fit(cls, columns, target):
+        # columns: mapping of API field name -> training column; target: tier per row
+        target = np.asarray(target, dtype=np.float64)
+        medians = {}
+        for key in MEDIAN_FIELDS:
+            col = np.asarray(columns[key], dtype=np.float64)
+            medians[key] = float(np.nanmedian(col)) if np.isfinite(col).any() else 0.0
+
+        # Industry target encoding: mean tier per industry, global mean for unseen ones
+        industry_keys = np.array([str(k) for k in columns[INDUSTRY_FIELD]], dtype=object)
+        uniq, inverse = np.unique(industry_keys, return_inverse=True)
+        sums = np.bincount(inverse, weights=target, minlength=len(uniq))
+        counts = np.bincount(inverse, minlength=len(uniq))
+        industry_map = {k: float(s / c) for k, s, c in zip(uniq.tolist(), sums, counts) if k != 'nan'}
+
+        return cls(industry_map, target.mean(), medians)
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d['industry_map'], d['global_mean'], d.get('medians'), d.get('features'))
+
+    @classmethod
+    def from_artifacts(cls, artifacts):
+        # Works for artifacts with a saved pipeline and for older ones (V1.5 keys only)
+        if 'pipeline' in artifacts:
+            return cls.from_dict(artifacts['pipeline'])
+        return cls(artifacts['industry_map'], artifacts['global_mean'], None, artifacts['features'])
+
+    def to_dict(self):
+        return {
+            'industry_map': self.industry_map,
+            'global_mean': self.global_mean,
+            'medians': self.medians,
+            'features': self.features,
+        }
+
+    def transform_columns(self, columns, n, errors=None):
+        # columns: mapping of API field name -> length-n sequence (missing fields use the defaults).
+        # Returns the (n, 7) feature matrix in self.features order and a per-row
+        # list of error messages (None = ok).
+        if errors is None:
+            errors = [None] * n
+
+        cols = {}
+        for key, default in NUMERIC_FIELDS:
+            cols[key] = _numeric_column(columns[key], key, errors, n) if key in columns else np.full(n, float(default))
+
+        # Null Handling (same rules as training)
+        for key in MEDIAN_FIELDS:
+            if key in self.medians:
+                cols[key] = np.where(np.isnan(cols[key]), self.medians[key], cols[key])
+        for key in ZERO_FILL_FIELDS:
+            cols[key] = np.nan_to_num(cols[key], nan=0.0)
+
+        # Log Transforms
+        with np.errstate(invalid='ignore', divide='ignore'):
+            log_emp = np.log1p(cols['employee_count'])
+            log_years = np.log1p(cols['years_active'])
+
+        # Governance Score (int() truncation of each flag)
+        gov_score = np.trunc(cols['esg_content']) + np.trunc(cols['un_global']) + np.trunc(cols['publicly_traded'])
+
+        # Interaction
+        size_x_gov = log_emp * (gov_score + 1)
+
+        # Industry Encoding (lookup once per distinct industry, then scatter)
+        if INDUSTRY_FIELD in columns and n:
+            industry_keys = np.array([str(k) for k in columns[INDUSTRY_FIELD]], dtype=object)
+            uniq, inverse = np.unique(industry_keys, return_inverse=True)
+            uniq_vals = np.array([self.industry_map.get(k, self.global_mean) for k in uniq], dtype=np.float64)
+            industry_encoded = uniq_vals[inverse]
+        else:
+            industry_encoded = np.full(n, self.industry_map.get(DEFAULT_INDUSTRY, self.global_mean))
+
+        X = np.column_stack([
+            log_emp,
+            log_years,
+            gov_score,
+            size_x_gov,
+            industry_encoded,
+            np.trunc(cols['business_type']),
+            np.trunc(cols['is_subsidiary'])
+        ])
+
+        # Rows that produced NaN/inf (e.g. negative employee counts) cannot be scored
+        bad = ~np.isfinite(X).all(axis=1)
+        for i in np.flatnonzero(bad):
+            if errors[i] is None:
+                errors[i] = 'Input produces non-finite features'
+
+        return X, errors
+
+    def transform_records(self, records):
+        # Same as transform_columns for a list of JSON records
+        errors = [None if isinstance(r, dict) else 'Record must be a JSON object' for r in records]
+        records = [r if isinstance(r, dict) else {} for r in records]
+
+        columns = {key: [r.get(key, default) for r in records] for key, default in NUMERIC_FIELDS}
+        columns[INDUSTRY_FIELD] = [r.get(INDUSTRY_FIELD, DEFAULT_INDUSTRY) for r in records]
+
+        return self.transform_columns(columns, len(records), errors)
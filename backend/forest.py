@@ -0,0 +1,307 @@
+import hashlib
+import os
+import numpy as np
+
+# ---------------------------------------------------------
+# Flat-Array Random Forest Evaluator
+# ---------------------------------------------------------
+# All trees of the forest are concatenated into one set of node arrays:
+#   feature[i], threshold[i]   split of node i (leaves: feature 0, threshold 0)
+#   children[2*i], [2*i + 1]   global left/right child (leaves point to themselves)
+#   value[i]                   class distribution of node i (DecisionTreeClassifier tree_.value)
+#   roots[t]                   index of the root node of tree t
+#   contributions[i, f]        change in value along the path from the root to node i
+#                              caused by splits on feature f (for explanations, see explain)
+# Leaves loop back to themselves, so every row can be pushed down every tree
+# for exactly max_depth levels without checking for leaves.
+#
+# Small batches advance all trees together (few NumPy calls per row). Large
+# batches are scored one tree at a time over big row blocks: each step then
+# reads only that tree's nodes, which stay in cache, and writes into
+# preallocated buffers.
+
+ROW_BLOCK = 256  # rows per all-trees traversal block (bounds the (rows x trees) temporaries)
+PER_TREE_MIN_ROWS = 2048  # batches at least this large are scored one tree at a time
+TREE_BLOCK = 16384  # rows per block when scoring one tree at a time
+EXPLAIN_BLOCK = 64  # rows per explanation block (the gather is (trees x rows x features x classes))
+
+def path_contributions(feature, children, value, roots, max_depth, n_features):
+    # Tree-path (Saabas) decomposition, precomputed per node: walking from the
+    # root to node i, each split on feature f moves the class distribution from
+    # value[parent] to value[child]; contributions[i, f] sums those moves. For a
+    # leaf, value[root] + contributions[leaf].sum(axis=0) == value[leaf].
+    # Filled one depth level at a time for all trees at once.
+    contributions = np.zeros((len(feature), n_features, value.shape[1]), dtype=np.float64)
+    frontier = np.asarray(roots, dtype=np.intp)
+    for _ in range(int(max_depth)):
+        frontier = frontier[children[2 * frontier] != frontier]  # internal nodes only
+        if not len(frontier):
+            break
+        for side in (0, 1):
+            kids = children[2 * frontier + side]
+            contributions[kids] = contributions[frontier]
+            contributions[kids, feature[frontier]] += value[kids] - value[frontier]
+        frontier = np.concatenate([children[2 * frontier], children[2 * frontier + 1]])
+    return contributions
+
+def flatten_forest(model):
+    # Works on any fitted sklearn RandomForestClassifier (only reads estimator.tree_)
+    n_classes = len(model.classes_)
+    features, thresholds, children, values, roots = [], [], [], [], []
+    offset = 0
+    max_depth = 0
+
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        is_leaf = tree.children_left == -1
+        node_ids = np.arange(tree.node_count)
+
+        features.append(np.where(is_leaf, 0, tree.feature))
+        thresholds.append(np.where(is_leaf, 0.0, tree.threshold))
+        left = np.where(is_leaf, node_ids, tree.children_left) + offset
+        right = np.where(is_leaf, node_ids, tree.children_right) + offset
+        children.append(np.column_stack([left, right]).ravel())
+
+        # sklearn >= 1.4 stores class fractions in tree_.value, which is
+        # exactly what DecisionTreeClassifier.predict_proba returns
+        values.append(tree.value[:, 0, :n_classes].astype(np.float64))
+
+        roots.append(offset)
+        offset += tree.node_count
+        max_depth = max(max_depth, tree.max_depth)
+
+    arrays = {
+        'feature': np.concatenate(features).astype(np.int32),
+        'threshold': np.concatenate(thresholds).astype(np.float64),
+        'children': np.concatenate(children).astype(np.int32),
+        'value': np.ascontiguousarray(np.concatenate(values)),
+        'roots': np.array(roots, dtype=np.int32),
+        'max_depth': np.int32(max_depth),
+        'classes': np.asarray(model.classes_).astype(np.int64),
+    }
+    # Precomputed at export time, so an explanation at serving time is one gather
+    arrays['contributions'] = path_contributions(
+        arrays['feature'], arrays['children'], arrays['value'], arrays['roots'], max_depth, model.n_features_in_)
+    return arrays
+
+def float32_floor(values):
+    # Largest float32 <= each value: for float32 inputs x, x > t exactly when
+    # x > float32_floor(t), so the comparison can stay in float32
+    rounded = values.astype(np.float32)
+    above = rounded.astype(np.float64) > values
+    rounded[above] = np.nextafter(rounded[above], np.float32(-np.inf))
+    return rounded
+
+def widen(values, distributions=False):
+    # float16 (compress_forest.py) is a storage format only: sums over hundreds
+    # of trees need float32 at least, and rounded class distributions are
+    # rescaled to sum to 1 again
+    if values.dtype != np.float16:
+        return values
+    values = values.astype(np.float32)
+    if distributions:
+        values /= values.sum(axis=1, keepdims=True)
+    return values
+
+class FlatForest:
+    def __init__(self, arrays):
+        # Index arrays are widened to intp once here so fancy indexing never has to cast
+        self.feature = arrays['feature'].astype(np.intp)
+        self.threshold = arrays['threshold']
+        self.children = arrays['children'].astype(np.intp)
+        self.value = widen(arrays['value'], distributions=True)
+        self.roots = arrays['roots'].astype(np.intp)
+        self.max_depth = int(arrays['max_depth'])
+        self.classes_ = arrays['classes']
+        self.n_estimators = len(self.roots)
+        # Set by train_model.py; exports from before versioning have none
+        self.version = str(arrays['version']) if 'version' in arrays else None
+        # Exports from before explanations are computed on first use
+        self._contributions = widen(arrays['contributions']) if 'contributions' in arrays else None
+        # Expected value of the forest before any split (mean root distribution)
+        self.bias = self.value[self.roots].mean(axis=0)
+        # Per-tree node arrays for large batches, built on first use
+        self._trees = None
+
+    @classmethod
+    def from_model(cls, model):
+        return cls(flatten_forest(model))
+
+    def apply(self, X):
+        # Global leaf index reached by every row in every tree: shape (n_trees, n_rows).
+        # All trees advance one level per step; rows are compared as float32,
+        # exactly like sklearn's tree code.
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n_features = X.shape[1]
+        flat_X = X.ravel()
+        row_offsets = np.arange(len(X)) * n_features
+        node = np.repeat(self.roots[:, np.newaxis], len(X), axis=1)
+        for _ in range(self.max_depth):
+            x = flat_X[row_offsets + self.feature[node]]
+            node = self.children[2 * node + (x > self.threshold[node])]
+        return node
+
+    def predict_proba(self, X):
+        X = np.asarray(X)
+        if len(X) >= PER_TREE_MIN_ROWS:
+            return self.predict_proba_per_tree(X)
+        proba = np.zeros((len(X), len(self.classes_)), dtype=np.float64)
+        for start in range(0, len(X), ROW_BLOCK):
+            leaves = self.apply(X[start:start + ROW_BLOCK])
+            # Summing over the leading (tree) axis adds the trees one after another
+            # in estimator order, as sklearn does, so the result is bit-for-bit
+            # identical to predict_proba
+            proba[start:start + ROW_BLOCK] = self.value[leaves].sum(axis=0)
+        proba /= self.n_estimators
+        return proba
+
+    @property
+    def trees(self):
+        # (depth, feature, threshold, children, value) per tree, indexed by a
+        # "state" 2 * local node id (+ 1 after going right): the node arrays are
+        # repeated twice, children hold states, thresholds are float32_floor()
+        if self._trees is None:
+            ends = np.append(self.roots[1:], len(self.feature))
+            threshold = float32_floor(self.threshold)
+            self._trees = []
+            for lo, hi in zip(self.roots.tolist(), ends.tolist()):
+                children = 2 * (self.children[2 * lo:2 * hi] - lo)
+                depth, frontier = 0, np.zeros(1, dtype=np.intp)
+                while True:
+                    frontier = frontier[children[2 * frontier] != 2 * frontier]  # internal nodes only
+                    if not len(frontier):
+                        break
+                    depth += 1
+                    frontier = np.concatenate([children[2 * frontier], children[2 * frontier + 1]]) // 2
+                self._trees.append((depth, np.repeat(self.feature[lo:hi], 2), np.repeat(threshold[lo:hi], 2),
+                                    children, np.repeat(self.value[lo:hi], 2, axis=0)))
+        return self._trees
+
+    def predict_proba_per_tree(self, X):
+        # Same result as predict_proba, bit for bit (the trees are still added in
+        # estimator order); faster for large batches
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n_features = X.shape[1]
+        proba = np.zeros((len(X), len(self.classes_)), dtype=np.float64)
+        for start in range(0, len(X), TREE_BLOCK):
+            rows = X[start:start + TREE_BLOCK]
+            flat_X, n = rows.ravel(), len(rows)
+            row_offsets = np.arange(n) * n_features
+            state, next_state, index, went_right = (np.empty(n, dtype=np.intp) for _ in range(4))
+            x, threshold = np.empty(n, dtype=np.float32), np.empty(n, dtype=np.float32)
+            # Summed in the dtype of value, like the all-trees path (float32 for float16 exports)
+            leaf_value = np.empty((n, len(self.classes_)), dtype=self.value.dtype)
+            block = np.zeros_like(leaf_value)
+            # mode='clip' lets take() write straight into `out` (states are always in range);
+            # comparisons are written as 0/1 intp, so adding them to the state needs no cast
+            for depth, feature, thresholds, children, value in self.trees:
+                if depth:
+                    # Every row starts at the root: one column comparison instead of the gathers
+                    np.greater(rows[:, feature[0]], thresholds[0], out=went_right, casting='unsafe')
+                    np.multiply(went_right, children[1] - children[0], out=state)
+                    state += children[0]
+                else:
+                    state.fill(0)
+                for _ in range(depth - 1):
+                    np.take(feature, state, out=index, mode='clip')
+                    index += row_offsets
+                    np.take(flat_X, index, out=x, mode='clip')
+                    np.take(thresholds, state, out=threshold, mode='clip')
+                    np.greater(x, threshold, out=went_right, casting='unsafe')
+                    np.add(state, went_right, out=next_state)
+                    np.take(children, next_state, out=state, mode='clip')
+                np.take(value, state, axis=0, out=leaf_value, mode='clip')
+                block += leaf_value
+            proba[start:start + n] = block
+        proba /= self.n_estimators
+        return proba
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+    @property
+    def contributions(self):
+        if self._contributions is None:
+            self._contributions = path_contributions(self.feature, self.children, self.value, self.roots,
+                                                     self.max_depth, int(self.feature.max()) + 1)
+        return self._contributions
+
+    def explain(self, X):
+        # One traversal gives both the probabilities (bit-identical to predict_proba)
+        # and their decomposition: proba[r] ~= bias + contributions[r].sum(axis=0),
+        # contributions shaped (n_rows, n_features, n_classes)
+        X = np.asarray(X)
+        contributions = self.contributions
+        proba = np.zeros((len(X), len(self.classes_)), dtype=np.float64)
+        explained = np.zeros((len(X),) + contributions.shape[1:], dtype=np.float64)
+        for start in range(0, len(X), EXPLAIN_BLOCK):
+            leaves = self.apply(X[start:start + EXPLAIN_BLOCK])
+            proba[start:start + EXPLAIN_BLOCK] = self.value[leaves].sum(axis=0)
+            explained[start:start + EXPLAIN_BLOCK] = contributions[leaves].sum(axis=0)
+        proba /= self.n_estimators
+        explained /= self.n_estimators
+        return proba, explained
+
+    def fingerprint(self):
+        # Content hash of the trees, used to check that derived artifacts
+        # (e.g. the decision table) were built from this exact forest
+        h = hashlib.sha256()
+        for arr in (self.feature.astype(np.int32), self.threshold,
+                    self.children.astype(np.int32), self.value):
+            h.update(np.ascontiguousarray(arr).tobytes())
+        return h.hexdigest()
+
+    def split_thresholds(self):
+        # Sorted unique split thresholds per feature
+        internal = self.children[0::2] != np.arange(len(self.feature))
+        n_features = int(self.feature.max()) + 1
+        return [
+            np.unique(self.threshold[internal & (self.feature == f)])
+            for f in range(n_features)
+        ]
+
+# ---------------------------------------------------------
+# Export / Load
+# ---------------------------------------------------------
+# The exported bundle also carries the fitted feature pipeline (see features.py),
+# so the server can run without unpickling (and therefore without importing) sklearn.
+
+def save_atomic(path, save, **arrays):
+    # Writes to a temporary file and renames it over `path`, so a server
+    # watching the file never reads a half-written export
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        save(f, **arrays)
+    os.replace(tmp_path, path)
+
+def save_flat_forest(path, model, pipeline, version=None, arrays=None):
+    # pipeline: FeaturePipeline.to_dict(); arrays: flatten_forest() output to
+    # save instead of flattening `model` (e.g. a compressed forest)
+    arrays = dict(flatten_forest(model) if arrays is None else arrays)
+    if version is not None:
+        arrays['version'] = np.array(version)
+    keys = sorted(pipeline['industry_map'])
+    median_keys = sorted(pipeline.get('medians') or {})
+    save_atomic(
+        path, np.savez,
+        features=np.array(pipeline['features']),
+        industry_keys=np.array(keys),
+        industry_values=np.array([pipeline['industry_map'][k] for k in keys], dtype=np.float64),
+        global_mean=np.float64(pipeline['global_mean']),
+        median_keys=np.array(median_keys, dtype=str),
+        median_values=np.array([pipeline['medians'][k] for k in median_keys], dtype=np.float64),
+        **arrays
+    )
+
+def load_flat_forest(path):
+    # Returns (FlatForest, pipeline dict for FeaturePipeline.from_dict)
+    with np.load(path, allow_pickle=False) as data:
+        arrays = {k: data[k] for k in data.files}
+    pipeline = {
+        'industry_map': dict(zip(arrays['industry_keys'].tolist(), arrays['industry_values'].tolist())),
+        'global_mean': float(arrays['global_mean']),
+        'features': arrays['features'].tolist(),
+    }
+    if 'median_keys' in arrays:
+        pipeline['medians'] = dict(zip(arrays['median_keys'].tolist(), arrays['median_values'].tolist()))
+    return FlatForest(arrays), pipeline
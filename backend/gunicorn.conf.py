@@ -0,0 +1,19 @@
+import gc
+import os
+
+# ---------------------------------------------------------
+# Gunicorn Settings (see Dockerfile: gunicorn -c gunicorn.conf.py app:app)
+# ---------------------------------------------------------
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+
+# Import app.py (and load the model) once in the master process. Workers are
+# forked from it and share those pages copy-on-write instead of each loading
+# their own copy, so adding a worker only costs its private heap.
+preload_app = True
+
+def when_ready(server):
+    # Runs after the preload, before the first fork: move every object loaded
+    # so far into the GC's permanent generation. Otherwise the first
+    # collection in each worker writes to their headers and un-shares the pages.
+    gc.freeze()
@@ -0,0 +1,56 @@
+import json
+import logging
+import os
+import random
+import sys
+import time
+
+# ---------------------------------------------------------
+# Structured, Sampled Logging
+# ---------------------------------------------------------
+# One JSON object per line on stdout: {"ts", "level", "event", ...fields}.
+#   TKD_LOG_LEVEL   DEBUG / INFO / WARNING / ERROR (default INFO)
+#   TKD_LOG_SAMPLE  fraction of requests logged with their payload and stage
+#                   timings (default 0.01; 0 = never, 1 = every request)
+# Errors are always logged; successful requests only when sampled, so the
+# hot path does no log I/O for the other 99%.
+
+LOG_LEVEL = os.environ.get('TKD_LOG_LEVEL', 'INFO').upper()
+SAMPLE_RATE = float(os.environ.get('TKD_LOG_SAMPLE', 0.01))
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f'.{int(record.msecs):03d}Z',
+            'level': record.levelname,
+            'event': record.getMessage(),
+        }
+        entry.update(getattr(record, 'fields', {}))
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+def get_logger(name='tkd'):
+    logger = logging.getLogger(name)
+    if not logger.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(JsonFormatter())
+        logger.addHandler(handler)
+        logger.setLevel(LOG_LEVEL)
+        logger.propagate = False
+
+        # Library warnings (e.g. sklearn version warnings on the pickle fallback)
+        # go through the same handler, once per location instead of per request
+        logging.captureWarnings(True)
+        warnings_logger = logging.getLogger('py.warnings')
+        warnings_logger.addHandler(handler)
+        warnings_logger.propagate = False
+    return logger
+
+def log_event(logger, level, event, exc_info=None, **fields):
+    if logger.isEnabledFor(level):
+        logger.log(level, event, exc_info=exc_info, extra={'fields': fields})
+
+def sampled():
+    # True for ~SAMPLE_RATE of calls
+    return SAMPLE_RATE >= 1 or (SAMPLE_RATE > 0 and random.random() < SAMPLE_RATE)
@@ -0,0 +1,94 @@
+import numpy as np
+from features import NUMERIC_FIELDS, INDUSTRY_FIELD, DEFAULT_INDUSTRY, INPUT_FIELDS
+
+# ---------------------------------------------------------
+# What-If Sensitivity Grid
+# ---------------------------------------------------------
+# Expands a base company plus per-field variations into one grid of inputs
+# (cartesian product of the varied fields, everything else from the base),
+# laid out as columns for FeaturePipeline.transform_columns. The server then
+# scores the whole grid in one forest pass.
+#
+# Variation specs, per field in "vary":
+#   [v1, v2, ...]                                   explicit values (any field)
+#   "toggle"                                        [0, 1] (flag fields)
+#   {"from": a, "to": b, "steps": n, "scale": s}    numeric range, s = "linear" or "log";
+#                                                   integer endpoints give integer steps
+
+FLAG_FIELDS = ['esg_content', 'un_global', 'publicly_traded', 'business_type', 'is_subsidiary']
+MAX_STEPS = 1000
+
+def _range_values(field, spec):
+    try:
+        low, high = float(spec['from']), float(spec['to'])
+        steps = int(spec.get('steps', 10))
+    except (KeyError, TypeError, ValueError):
+        raise ValueError(f"Range for '{field}' needs numeric 'from' and 'to' (and an integer 'steps')")
+    if not 2 <= steps <= MAX_STEPS:
+        raise ValueError(f"'steps' for '{field}' must be between 2 and {MAX_STEPS}")
+
+    scale = spec.get('scale', 'linear')
+    if scale == 'log':
+        if low < 0 or high < 0:
+            raise ValueError(f"Log range for '{field}' needs non-negative endpoints")
+        # Spaced on log1p, the transform the model sees, so 0 is a valid endpoint
+        values = np.expm1(np.linspace(np.log1p(low), np.log1p(high), steps))
+    elif scale == 'linear':
+        values = np.linspace(low, high, steps)
+    else:
+        raise ValueError(f"Unknown scale for '{field}': {scale!r} (expected 'linear' or 'log')")
+
+    if isinstance(spec['from'], int) and isinstance(spec['to'], int):
+        # Rounding can make neighbouring steps equal; keep each value once, in order
+        values = np.round(values)
+        values = values[np.sort(np.unique(values, return_index=True)[1])].astype(int)
+    return values.tolist()
+
+def parse_axes(vary):
+    # vary: {field: spec} -> list of (field, values), in request order
+    if not isinstance(vary, dict) or not vary:
+        raise ValueError("'vary' must be a non-empty object of {field: values | 'toggle' | range}")
+
+    axes = []
+    for field, spec in vary.items():
+        if field not in INPUT_FIELDS:
+            raise ValueError(f"Unknown field in 'vary': {field!r} (expected one of {INPUT_FIELDS})")
+        if spec == 'toggle':
+            if field not in FLAG_FIELDS:
+                raise ValueError(f"'toggle' only applies to flag fields ({FLAG_FIELDS}), not '{field}'")
+            values = [0, 1]
+        elif isinstance(spec, list):
+            values = spec
+        elif isinstance(spec, dict):
+            if field == INDUSTRY_FIELD:
+                raise ValueError(f"'{field}' takes a list of values, not a range")
+            values = _range_values(field, spec)
+        else:
+            raise ValueError(f"Invalid spec for '{field}': expected a list, 'toggle' or a range object")
+        if not values:
+            raise ValueError(f"No values for '{field}'")
+        axes.append((field, values))
+    return axes
+
+def grid_size(axes):
+    size = 1
+    for _, values in axes:
+        size *= len(values)
+    return size
+
+def expand_grid(base, axes):
+    # Returns (columns, n): row i is the base company with the varied fields set to
+    # grid point i (C order: the last axis changes fastest, as in np.reshape)
+    shape = [len(values) for _, values in axes]
+    n = grid_size(axes)
+
+    columns = {}
+    for key, default in NUMERIC_FIELDS:
+        columns[key] = [base.get(key, default)] * n
+    columns[INDUSTRY_FIELD] = [base.get(INDUSTRY_FIELD, DEFAULT_INDUSTRY)] * n
+
+    # indices[axis][i]: position on that axis of grid point i
+    indices = np.indices(shape).reshape(len(shape), n)
+    for (field, values), index in zip(axes, indices.tolist()):
+        columns[field] = [values[i] for i in index]
+    return columns, n
@@ -0,0 +1,76 @@
+import os
+import sys
+import time
+import warnings
+import joblib
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+from forest import FlatForest
+
+warnings.filterwarnings('ignore')
+
+ARTIFACTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend', 'tkd_model_artifacts.pkl')
+
+BATCH_SIZES = [1, 100, 1000, 10000]
+
+def random_features(n, industry_values, seed=0):
+    # Synthetic rows in the same shape as the /predict feature vector
+    rng = np.random.RandomState(seed)
+    log_emp = np.log1p(rng.randint(1, 100000, n))
+    log_years = np.log1p(rng.randint(0, 120, n))
+    gov_score = rng.randint(0, 4, n)
+    return np.column_stack([
+        log_emp,
+        log_years,
+        gov_score,
+        log_emp * (gov_score + 1),
+        rng.choice(industry_values, n),
+        rng.randint(0, 2, n),
+        rng.randint(0, 2, n)
+    ])
+
+def time_call(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return np.median(timings) * 1000
+
+def run_benchmark():
+    print(">>> Loading Artifacts...")
+    artifacts = joblib.load(ARTIFACTS_PATH)
+    model = artifacts['model']
+    feature_cols = artifacts['features']
+    industry_values = list(artifacts['industry_map'].values())
+
+    # Old path: predict + predict_proba on a bare array (two forest traversals + warning)
+    def old_path(X):
+        model.predict(X)
+        model.predict_proba(X)
+
+    # New path: one predict_proba on a named frame, class = argmax
+    def new_path(X):
+        proba = model.predict_proba(pd.DataFrame(X, columns=feature_cols))
+        model.classes_[proba.argmax(axis=1)]
+
+    # Flat path: the served evaluator (backend/forest.py), no sklearn in the call
+    flat = FlatForest.from_model(model)
+    def flat_path(X):
+        proba = flat.predict_proba(X)
+        flat.classes_[proba.argmax(axis=1)]
+
+    print(f"\n{'Batch Size':<12} | {'Old (ms)':<10} | {'New (ms)':<10} | {'Flat (ms)':<10} | {'Speedup (Old/Flat)'}")
+    print("-" * 70)
+    for n in BATCH_SIZES:
+        X = random_features(n, industry_values)
+        repeat = 50 if n <= 1000 else 5
+        old_ms = time_call(lambda: old_path(X), repeat)
+        new_ms = time_call(lambda: new_path(X), repeat)
+        flat_ms = time_call(lambda: flat_path(X), repeat)
+        print(f"{n:<12} | {old_ms:<10.2f} | {new_ms:<10.2f} | {flat_ms:<10.2f} | {old_ms / flat_ms:.2f}x")
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,248 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import warnings
+import numpy as np
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+sys.path.insert(0, BACKEND_DIR)
+from forest import load_flat_forest
+from decision_table import load_decision_table
+from features import FeaturePipeline, NUMERIC_FIELDS, INDUSTRY_FIELD
+
+warnings.filterwarnings('ignore')
+
+# ---------------------------------------------------------
+# Offline Micro-Benchmark Suite (no server needed)
+# ---------------------------------------------------------
+# Times the serving path in-process: artifact loading, feature engineering
+# (per row and batched), the forest / decision table at batch sizes 1..100k
+# and end-to-end Flask handling through the test client, plus cold start
+# (import + first response in a fresh process). Every metric is the median
+# wall time of one call in ms.
+#
+#   python scripts/benchmark_suite.py run --save benchmark_baseline.json
+#   python scripts/benchmark_suite.py compare benchmark_baseline.json --threshold 0.25
+#
+# `compare` runs the suite again (or reads a second results file) and exits
+# with code 1 if any metric got slower than baseline * (1 + threshold).
+# Baselines are machine specific: save and compare on the same host.
+
+BATCH_SIZES = [1, 10, 100, 1000, 10000, 100000]
+QUICK_BATCH_SIZES = [1, 100, 10000]
+DEFAULT_BASELINE = 'benchmark_baseline.json'
+
+def measure(fn, min_time=0.2, min_repeat=3, max_repeat=2000):
+    # Median ms per call; repeats until min_time has been spent (at least min_repeat calls)
+    fn()  # warm-up
+    timings = []
+    total = 0.0
+    while len(timings) < min_repeat or (total < min_time and len(timings) < max_repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        timings.append(elapsed)
+        total += elapsed
+    return float(np.median(timings) * 1000)
+
+def random_records(n, industries, seed=0):
+    # API-shaped request bodies (same fields as /predict)
+    rng = np.random.RandomState(seed)
+    employees = rng.randint(1, 100000, n).tolist()
+    years = rng.randint(0, 120, n).tolist()
+    flags = rng.randint(0, 2, (n, 5)).tolist()
+    picks = rng.randint(0, len(industries), n).tolist()
+    records = []
+    for i in range(n):
+        record = {'employee_count': employees[i], 'years_active': years[i]}
+        for (key, _), flag in zip(NUMERIC_FIELDS[2:], flags[i]):
+            record[key] = flag
+        record[INDUSTRY_FIELD] = industries[picks[i]]
+        records.append(record)
+    return records
+
+# ---------------------------------------------------------
+# Benchmarks
+# ---------------------------------------------------------
+def bench_load(results):
+    forest_path = os.path.join(BACKEND_DIR, 'tkd_model_forest.npz')
+    table_path = os.path.join(BACKEND_DIR, 'tkd_model_table.npz')
+    pkl_path = os.path.join(BACKEND_DIR, 'tkd_model_artifacts.pkl')
+
+    results['load.flat_forest_npz'] = measure(lambda: load_flat_forest(forest_path))
+    if os.path.exists(table_path):
+        results['load.decision_table_npz'] = measure(lambda: load_decision_table(table_path))
+    try:
+        import joblib
+        results['load.artifacts_pkl'] = measure(lambda: joblib.load(pkl_path), min_repeat=3, min_time=1.0)
+    except ImportError:  # serving-only environment
+        pass
+
+def bench_features(results, pipeline, n_batch=10000):
+    records = random_records(n_batch, sorted(pipeline.industry_map))
+    results['features.per_row'] = measure(lambda: pipeline.transform_records(records[:1]))
+    results['features.batch_10k'] = measure(lambda: pipeline.transform_records(records))
+    columns = {key: [r[key] for r in records] for key in records[0]}
+    results['features.columns_10k'] = measure(lambda: pipeline.transform_columns(columns, n_batch))
+
+def bench_inference(results, name, model, pipeline, batch_sizes):
+    X_all, _ = pipeline.transform_records(random_records(max(batch_sizes), sorted(pipeline.industry_map), seed=1))
+    for n in batch_sizes:
+        X = X_all[:n]
+        results[f'{name}.batch_{n}'] = measure(lambda: model.predict_proba(X), min_repeat=3 if n >= 10000 else 20)
+
+def bench_flask(results, pipeline):
+    # Fresh app import inside backend/ (relative artifact paths), prediction cache off
+    # so every request really runs the forest, request logging at its production default
+    os.environ['TKD_CACHE_SIZE'] = '0'
+    os.environ.setdefault('TKD_LOG_LEVEL', 'WARNING')
+    cwd = os.getcwd()
+    os.chdir(BACKEND_DIR)
+    try:
+        import app as app_module
+    finally:
+        os.chdir(cwd)
+    client = app_module.app.test_client()
+
+    records = random_records(1000, sorted(pipeline.industry_map), seed=2)
+    results['flask.predict'] = measure(lambda: client.post('/predict', json=records[0]))
+    results['flask.predict_explain'] = measure(lambda: client.post('/predict?explain=1', json=records[0]))
+    results['flask.predict_batch_1000'] = measure(lambda: client.post('/predict/batch', json=records))
+
+# Runs in a fresh interpreter inside backend/: what a new worker pays before
+# it can answer (imports, artifact load, warm-up, first request)
+STARTUP_SCRIPT = '''
+import json, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+response = app.app.test_client().get('/ready')
+assert response.status_code == 200, response.get_json()
+done = time.perf_counter()
+print(json.dumps({'import_app': (imported - start) * 1000, 'first_response': (done - start) * 1000}))
+'''
+
+def bench_startup(results, runs=3):
+    env = dict(os.environ, TKD_LOG_LEVEL='WARNING')
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT], cwd=BACKEND_DIR, env=env,
+                             capture_output=True, text=True, check=True).stdout
+        samples.append(json.loads(out.strip().splitlines()[-1]))
+    for key in samples[0]:
+        results[f'startup.{key}'] = float(np.median([s[key] for s in samples]))
+
+def run_suite(quick=False):
+    batch_sizes = QUICK_BATCH_SIZES if quick else BATCH_SIZES
+    results = {}
+    print(">>> Artifact Loading...", file=sys.stderr)
+    bench_load(results)
+
+    forest, pipeline_dict = load_flat_forest(os.path.join(BACKEND_DIR, 'tkd_model_forest.npz'))
+    pipeline = FeaturePipeline.from_dict(pipeline_dict)
+
+    print(">>> Feature Engineering...", file=sys.stderr)
+    bench_features(results, pipeline)
+
+    print(">>> Inference...", file=sys.stderr)
+    bench_inference(results, 'forest', forest, pipeline, batch_sizes)
+    table_path = os.path.join(BACKEND_DIR, 'tkd_model_table.npz')
+    if os.path.exists(table_path):
+        bench_inference(results, 'table', load_decision_table(table_path), pipeline, batch_sizes)
+
+    print(">>> Flask (test client)...", file=sys.stderr)
+    bench_flask(results, pipeline)
+
+    print(">>> Cold Start (fresh process)...", file=sys.stderr)
+    bench_startup(results)
+
+    return {
+        'metrics_ms': results,
+        'meta': {
+            'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'host': platform.node(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'forest_fingerprint': forest.fingerprint(),
+        },
+    }
+
+def print_results(report):
+    print(f"\n{'Metric':<32} | {'ms':>10}")
+    print("-" * 46)
+    for name, ms in report['metrics_ms'].items():
+        print(f"{name:<32} | {ms:>10.4f}")
+
+# ---------------------------------------------------------
+# Baseline Comparison
+# ---------------------------------------------------------
+def compare(baseline, current, threshold, min_delta_ms):
+    # A metric regresses if it is both > threshold slower (relative) and > min_delta_ms slower (absolute)
+    if baseline['meta'].get('forest_fingerprint') != current['meta'].get('forest_fingerprint'):
+        print("Note: the forest differs from the baseline's (new artifacts); inference timings include the model change.")
+    if baseline['meta'].get('host') != current['meta'].get('host'):
+        print(f"Note: baseline was recorded on '{baseline['meta'].get('host')}', not this host.")
+
+    regressions = []
+    print(f"\n{'Metric':<32} | {'Baseline ms':>12} | {'Current ms':>12} | {'Change':>8}")
+    print("-" * 76)
+    for name, base_ms in baseline['metrics_ms'].items():
+        if name not in current['metrics_ms']:
+            print(f"{name:<32} | {base_ms:>12.4f} | {'missing':>12} |")
+            continue
+        cur_ms = current['metrics_ms'][name]
+        change = cur_ms / base_ms - 1 if base_ms else 0.0
+        regressed = change > threshold and cur_ms - base_ms > min_delta_ms
+        if regressed:
+            regressions.append(name)
+        print(f"{name:<32} | {base_ms:>12.4f} | {cur_ms:>12.4f} | {change:>+7.1%}{'  REGRESSION' if regressed else ''}")
+
+    if regressions:
+        print(f"\nFAILED: {len(regressions)} metric(s) regressed by more than {threshold:.0%}: {', '.join(regressions)}")
+    else:
+        print(f"\nOK: no metric regressed by more than {threshold:.0%}")
+    return not regressions
+
+def save_report(report, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to '{path}'")
+
+def load_report(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline micro-benchmarks for loading, features, inference and Flask handling")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = sub.add_parser('run', help="Run the suite and optionally save the results as a baseline")
+    run_parser.add_argument('--save', nargs='?', const=DEFAULT_BASELINE, metavar='PATH',
+                            help=f"Save the results (default path: {DEFAULT_BASELINE})")
+    run_parser.add_argument('--quick', action='store_true', help="Fewer batch sizes")
+
+    cmp_parser = sub.add_parser('compare', help="Fail if the current results regress against a baseline")
+    cmp_parser.add_argument('baseline', nargs='?', default=DEFAULT_BASELINE, help=f"Baseline file (default: {DEFAULT_BASELINE})")
+    cmp_parser.add_argument('current', nargs='?', help="Results file to check (default: run the suite now)")
+    cmp_parser.add_argument('--threshold', type=float, default=0.25, help="Allowed relative slowdown (default: 0.25 = 25%%)")
+    cmp_parser.add_argument('--min-delta-ms', type=float, default=0.02,
+                            help="Ignore slowdowns smaller than this many ms (timer noise, default: 0.02)")
+    cmp_parser.add_argument('--quick', action='store_true', help="Fewer batch sizes")
+    cmp_parser.add_argument('--save', metavar='PATH', help="Also save the current results")
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        report = run_suite(args.quick)
+        print_results(report)
+        if args.save:
+            save_report(report, args.save)
+    else:
+        baseline = load_report(args.baseline)
+        current = load_report(args.current) if args.current else run_suite(args.quick)
+        if args.save:
+            save_report(current, args.save)
+        sys.exit(0 if compare(baseline, current, args.threshold, args.min_delta_ms) else 1)
@@ -0,0 +1,285 @@
+import argparse
+import json
+import os
+import sys
+import time
+import warnings
+from types import SimpleNamespace
+import joblib
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+from forest import FlatForest, flatten_forest, save_flat_forest
+from features import FeaturePipeline
+from data_loader import CACHE_DIR
+from train_model import prepare_training_data, random_feature_matrix
+from hyperparam_search import measure_latency
+
+warnings.filterwarnings('ignore')
+
+# ---------------------------------------------------------
+# Forest Compression (post-training)
+# ---------------------------------------------------------
+# Shrinks a trained forest for serving, in three steps:
+#
+#   1. Tree selection: trees are added greedily, each time the one that makes
+#      the subset's predicted tier agree with the full forest on the most
+#      inputs (ties: closest probabilities). A compression level is the
+#      smallest prefix that reaches an agreement target.
+#   2. Leaf merging: a split whose two leaves predict the same distribution
+#      (within --leaf-tolerance) becomes a leaf itself, bottom-up, and the
+#      unreachable nodes are dropped. Tolerance 0 is lossless.
+#   3. Precision (--precision): thresholds become float32, rounded down, which
+#      is lossless because rows are compared as float32 anyway; leaf
+#      distributions and explanation contributions become float32 or float16.
+#
+# Selection runs on random inputs plus the training rows; agreement is then
+# checked on a separate set of random inputs. Accuracy is on the training rows
+# (the only labels there are). Every level is written and timed with the
+# served evaluator; the smallest one that keeps --min-agreement on the check
+# set is saved as the compressed artifact:
+#
+#   python scripts/compress_forest.py
+#   python scripts/compress_forest.py --targets 0.999 0.99 --precision float16 --install
+#
+# --install replaces backend/tkd_model_forest.npz (the server hot-reloads it
+# with TKD_RELOAD_POLL; the decision table no longer matches and is skipped).
+#
+# Run it from the repository root, like train_model.py: the workbooks and the
+# .tkd_cache directory are found relative to the working directory. The
+# training rows are loaded read-only (name mapping and reports are not rewritten).
+
+DEFAULT_TARGETS = [1.0, 0.999, 0.995, 0.99, 0.98]
+SELECTION_ROWS = 5000
+CHECK_ROWS = 20000
+COMPRESS_DIR = os.path.join(CACHE_DIR, 'compressed')
+BACKEND_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+# ---------------------------------------------------------
+# 1. Tree Selection
+# ---------------------------------------------------------
+def tree_probabilities(flat, X):
+    # (n_trees, n_rows, n_classes): every tree's distribution for every row
+    # (float32: only used to rank trees, and it halves the memory traffic)
+    return np.concatenate([flat.value[flat.apply(X[start:start + 1024])].astype(np.float32)
+                           for start in range(0, len(X), 1024)], axis=1)
+
+def greedy_tree_order(per_tree):
+    # Returns (order, agreement[k] of the first k + 1 trees with the full forest)
+    full = per_tree.mean(axis=0)
+    target = full.argmax(axis=1)
+    remaining = np.arange(len(per_tree))
+    total = np.zeros_like(full)
+    order, agreement = [], []
+    for k in range(1, len(per_tree) + 1):
+        candidates = total + per_tree[remaining]  # (n_remaining, n_rows, n_classes)
+        agree = (candidates.argmax(axis=2) == target).mean(axis=1)
+        distance = np.abs(candidates / k - full).sum(axis=2).mean(axis=1)
+        best = np.lexsort((distance, -agree))[0]
+        order.append(int(remaining[best]))
+        agreement.append(float(agree[best]))
+        total = candidates[best]
+        remaining = np.delete(remaining, best)
+    return order, agreement
+
+# ---------------------------------------------------------
+# 2. Leaf Merging
+# ---------------------------------------------------------
+def merge_leaves(tree, n_classes, tolerance=0.0):
+    # Returns a pruned copy of an sklearn tree_ (same attributes flatten_forest
+    # reads) and the number of splits turned into leaves
+    left, right = tree.children_left.copy(), tree.children_right.copy()
+    value = tree.value[:, 0, :n_classes].astype(np.float64)
+    merged = 0
+    # Children always have higher ids than their parent, so walking backwards
+    # lets merges cascade upwards in a single pass
+    for node in range(tree.node_count - 1, -1, -1):
+        l, r = left[node], right[node]
+        if l == -1 or left[l] != -1 or left[r] != -1:
+            continue
+        if np.abs(value[l] - value[r]).max() <= tolerance:
+            if np.array_equal(value[l], value[r]):
+                value[node] = value[l]  # keep the exact numbers the leaves had
+            left[node] = right[node] = -1
+            merged += 1
+
+    # Renumber the reachable nodes (parents before children, as sklearn does)
+    keep, depth = [], {0: 0}
+    stack = [0]
+    while stack:
+        node = stack.pop()
+        keep.append(node)
+        if left[node] != -1:
+            depth[right[node]] = depth[left[node]] = depth[node] + 1
+            stack.extend((right[node], left[node]))
+    keep = np.array(keep)
+    new_id = np.full(tree.node_count, -1)
+    new_id[keep] = np.arange(len(keep))
+    is_leaf = left[keep] == -1
+    pruned = SimpleNamespace(
+        node_count=len(keep),
+        max_depth=max(depth.values()),
+        feature=np.where(is_leaf, -2, tree.feature[keep]),
+        threshold=np.where(is_leaf, -2.0, tree.threshold[keep]),
+        children_left=np.where(is_leaf, -1, new_id[left[keep]]),
+        children_right=np.where(is_leaf, -1, new_id[right[keep]]),
+        value=value[keep][:, np.newaxis, :],
+    )
+    return pruned, merged
+
+def compressed_arrays(rf, trees, tolerance=0.0):
+    # flatten_forest() output for the selected trees, leaves merged
+    n_classes = len(rf.classes_)
+    pruned, merged = [], 0
+    for t in trees:
+        tree, count = merge_leaves(rf.estimators_[t].tree_, n_classes, tolerance)
+        pruned.append(SimpleNamespace(tree_=tree))
+        merged += count
+    model = SimpleNamespace(estimators_=pruned, classes_=rf.classes_, n_features_in_=rf.n_features_in_)
+    return flatten_forest(model), merged
+
+# ---------------------------------------------------------
+# 3. Precision
+# ---------------------------------------------------------
+def reduce_precision(arrays, precision):
+    if precision == 'float64':
+        return arrays
+    arrays = dict(arrays)
+    # Largest float32 <= threshold: for float32 inputs x, x <= t iff x <= that value
+    threshold = arrays['threshold'].astype(np.float32)
+    above = threshold.astype(np.float64) > arrays['threshold']
+    threshold[above] = np.nextafter(threshold[above], np.float32(-np.inf))
+    arrays['threshold'] = threshold
+
+    dtype = np.float32 if precision == 'float32' else np.float16
+    arrays['value'] = arrays['value'].astype(dtype)
+    arrays['contributions'] = arrays['contributions'].astype(dtype)
+    # Smallest index types (FlatForest widens them on load)
+    arrays['feature'] = arrays['feature'].astype(np.int8)
+    if len(arrays['feature']) < 2 ** 15:
+        arrays['children'] = arrays['children'].astype(np.int16)
+        arrays['roots'] = arrays['roots'].astype(np.int16)
+    return arrays
+
+# ---------------------------------------------------------
+# Report
+# ---------------------------------------------------------
+def evaluate_level(name, path, n_trees, merged, full, X_check, X_train, y_train):
+    with np.load(path, allow_pickle=False) as data:
+        flat = FlatForest({k: data[k] for k in data.files})
+    record = {
+        'level': name,
+        'path': path,
+        'trees': n_trees,
+        'nodes': len(flat.feature),
+        'merged_splits': merged,
+        'agreement': float((flat.predict(X_check) == full.predict(X_check)).mean()),
+        'max_proba_diff': float(np.abs(flat.predict_proba(X_check) - full.predict_proba(X_check)).max()),
+        'train_accuracy': float((flat.predict(X_train) == y_train).mean()),
+        'size_kb': os.path.getsize(path) / 1024,
+    }
+    record.update(measure_latency(path, X_check))
+    return record
+
+def print_levels(records, chosen):
+    print(f"\n>>> Compression Levels (agreement on held-out random inputs)")
+    print(f"{'Level':<14}{'Trees':>6}{'Nodes':>8}{'Merged':>8}{'Agree':>9}{'Max dP':>9}{'Acc':>8}"
+          f"{'KB':>9}{'1 row ms':>10}{'us/row@1k':>11}")
+    for r in records:
+        mark = '  <- saved' if r is chosen else ''
+        print(f"{r['level']:<14}{r['trees']:>6}{r['nodes']:>8}{r['merged_splits']:>8}{r['agreement']:>9.4f}"
+              f"{r['max_proba_diff']:>9.4f}{r['train_accuracy']:>8.4f}{r['size_kb']:>9.0f}"
+              f"{r['latency_single_ms']:>10.3f}{r['latency_batch_us_per_row']:>11.2f}{mark}")
+
+def compress(artifacts_path, targets=None, tolerance=0.0, precision='float64', min_agreement=0.99,
+             output=None, install=False, rebuild_cache=False, out_dir=COMPRESS_DIR):
+    start = time.perf_counter()
+    # An agreement above 1 can never be reached
+    targets = sorted({min(t, 1.0) for t in targets or DEFAULT_TARGETS}, reverse=True)
+    artifacts = joblib.load(artifacts_path)
+    rf = artifacts['model']
+    pipeline = FeaturePipeline.from_artifacts(artifacts).to_dict()
+    full = FlatForest.from_model(rf)
+
+    X_df, y_series, _ = prepare_training_data(rebuild_cache, read_only=True)
+    X_train, y_train = X_df.to_numpy(dtype=np.float64), y_series.to_numpy()
+    X_select = np.vstack([random_feature_matrix(artifacts, SELECTION_ROWS, seed=0), X_train])
+    X_check = random_feature_matrix(artifacts, CHECK_ROWS, seed=2)
+
+    print(f"\n>>> Selecting Trees ({full.n_estimators} trees, {len(X_select)} selection rows)...")
+    select_start = time.perf_counter()
+    order, agreement = greedy_tree_order(tree_probabilities(full, X_select))
+    print(f"Greedy order computed in {time.perf_counter() - select_start:.1f}s")
+
+    os.makedirs(out_dir, exist_ok=True)
+    full_path = os.path.join(out_dir, 'full.npz')
+    save_flat_forest(full_path, rf, pipeline, artifacts.get('version'))
+    records = [evaluate_level('full', full_path, full.n_estimators, 0, full, X_check, X_train, y_train)]
+    for target in targets:
+        # Float32 sums may never quite reach a target (e.g. a tie broken the other way): keep every tree
+        n_trees = next((k + 1 for k, a in enumerate(agreement) if a >= target), len(order))
+        arrays, merged = compressed_arrays(rf, order[:n_trees], tolerance)
+        arrays = reduce_precision(arrays, precision)
+        arrays['version'] = np.array(f"{artifacts.get('version') or full.fingerprint()[:12]}-c{n_trees}")
+        path = os.path.join(out_dir, f"agree_{target:g}.npz")
+        save_flat_forest(path, rf, pipeline, arrays=arrays)
+        records.append(evaluate_level(f"agree>={target:g}", path, n_trees, merged, full,
+                                      X_check, X_train, y_train))
+
+    # Smallest level that still agrees often enough on unseen inputs
+    passing = [r for r in records if r['agreement'] >= min_agreement]
+    chosen = min(passing, key=lambda r: (r['size_kb'], r['latency_single_ms']))
+    print_levels(records, chosen)
+
+    if output is None:
+        output = os.path.join(BACKEND_DIR, 'tkd_model_forest.npz') if install else \
+            os.path.splitext(artifacts_path)[0] + '_forest_compressed.npz'
+    with open(chosen['path'], 'rb') as f:
+        data = f.read()
+    tmp_path = f"{output}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, output)
+
+    report = {
+        'artifacts': artifacts_path,
+        'version': artifacts.get('version'),
+        'leaf_tolerance': tolerance,
+        'precision': precision,
+        'min_agreement': min_agreement,
+        'selection_rows': len(X_select),
+        'check_rows': len(X_check),
+        'greedy_agreement': agreement,
+        'levels': records,
+        'saved': dict(chosen, path=output),
+    }
+    report_path = os.path.join(out_dir, 'report.json')
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    base = records[0]
+    print(f"Saved {chosen['level']} ({chosen['trees']} trees, {chosen['size_kb']:.0f} KB vs {base['size_kb']:.0f} KB, "
+          f"{base['latency_single_ms'] / chosen['latency_single_ms']:.1f}x faster per row) to '{output}'")
+    print(f"Compression report saved to '{report_path}' ({time.perf_counter() - start:.1f}s)")
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Select, prune and shrink a trained forest for serving")
+    parser.add_argument('--artifacts', default=os.path.join(BACKEND_DIR, 'tkd_model_artifacts.pkl'),
+                        help="Trained artifact to compress (default: backend/tkd_model_artifacts.pkl)")
+    parser.add_argument('--targets', type=float, nargs='+', default=DEFAULT_TARGETS,
+                        help=f"Agreement targets, one compression level each (default: {DEFAULT_TARGETS})")
+    parser.add_argument('--leaf-tolerance', type=float, default=0.0,
+                        help="Merge sibling leaves whose distributions differ by at most this much (default: 0, lossless)")
+    parser.add_argument('--precision', choices=['float64', 'float32', 'float16'], default='float64',
+                        help="Storage precision of leaf distributions and contributions (default: float64)")
+    parser.add_argument('--min-agreement', type=float, default=0.99,
+                        help="Agreement on held-out inputs the saved level must keep (default: 0.99)")
+    parser.add_argument('--output', default=None,
+                        help="Where to write the chosen level (default: <artifacts>_forest_compressed.npz)")
+    parser.add_argument('--install', action='store_true',
+                        help="Write the chosen level over backend/tkd_model_forest.npz")
+    parser.add_argument('--rebuild-cache', action='store_true',
+                        help="Re-parse the Excel workbooks instead of using the columnar cache")
+    args = parser.parse_args()
+    compress(args.artifacts, args.targets, args.leaf_tolerance, args.precision, args.min_agreement,
+             args.output, args.install, args.rebuild_cache)
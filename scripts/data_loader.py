@@ -0,0 +1,110 @@
+import hashlib
+import json
+import os
+import time
+import pandas as pd
+
+# ---------------------------------------------------------
+# Shared Workbook Loading (with columnar cache)
+# ---------------------------------------------------------
+# Parsing the Phase 1 / Phase 2 workbooks with openpyxl is the slowest part of
+# every training or analysis run. The first read of a workbook concatenates
+# all of its sheets (column names stripped, plus a 'Sheet' column) and writes
+# them to an uncompressed Feather file; later runs memory-map that file
+# instead of re-parsing the XLSX.
+#
+# The cache is keyed on the workbook's size/mtime, with a content hash as the
+# fallback check, so touching a file without changing it does not rebuild.
+
+FEATURES_WORKBOOK = "Model Datası, Phase 2.xlsx"
+LABELS_WORKBOOK = "Model Datası, Phase 1.xlsx"
+CACHE_DIR = ".tkd_cache"
+
+try:
+    import pyarrow.feather as feather
+except ImportError:  # cache disabled, workbooks are parsed every time
+    feather = None
+
+def _file_hash(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+def _read_excel_sheets(path):
+    xls = pd.ExcelFile(path)
+    frames = []
+    for sheet_name in xls.sheet_names:
+        df = pd.read_excel(xls, sheet_name)
+        df.columns = [str(c).strip() for c in df.columns]
+        df['Sheet'] = sheet_name
+        frames.append(df)
+    return pd.concat(frames, ignore_index=True)
+
+def _arrow_safe(df):
+    # Arrow needs one type per column; mixed object columns (e.g. a numeric
+    # company name) are stored as strings
+    for col in df.columns[df.dtypes == object]:
+        df[col] = df[col].map(lambda v: v if v is None or isinstance(v, str) or pd.isna(v) else str(v))
+    return df
+
+def load_workbook(path, rebuild=False, cache_dir=CACHE_DIR):
+    # All sheets of `path` as one frame (stripped column names + 'Sheet')
+    start = time.perf_counter()
+    if feather is None:
+        df = _read_excel_sheets(path)
+        print(f"   - Parsed '{path}' in {time.perf_counter() - start:.3f}s (pyarrow not installed, no cache)")
+        return df
+
+    stem = os.path.splitext(os.path.basename(path))[0]
+    cache_path = os.path.join(cache_dir, f"{stem}.feather")
+    manifest_path = os.path.join(cache_dir, f"{stem}.json")
+    stat = os.stat(path)
+
+    manifest = None
+    if not rebuild and os.path.exists(cache_path) and os.path.exists(manifest_path):
+        with open(manifest_path, encoding='utf-8') as f:
+            manifest = json.load(f)
+
+    valid = False
+    if manifest is not None:
+        if manifest['size'] == stat.st_size and manifest['mtime'] == stat.st_mtime:
+            valid = True
+        elif manifest['sha256'] == _file_hash(path):
+            # Touched but unchanged: refresh the manifest, keep the cache
+            manifest.update(size=stat.st_size, mtime=stat.st_mtime)
+            with open(manifest_path, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, indent=2)
+            valid = True
+
+    if valid:
+        df = feather.read_table(cache_path, memory_map=True).to_pandas()
+        print(f"   - Loaded '{path}' from cache in {time.perf_counter() - start:.3f}s")
+        return df
+
+    df = _arrow_safe(_read_excel_sheets(path))
+    parse_time = time.perf_counter() - start
+
+    os.makedirs(cache_dir, exist_ok=True)
+    feather.write_feather(df, cache_path, compression='uncompressed')
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'source': os.path.abspath(path),
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+            'sha256': _file_hash(path),
+            'rows': len(df),
+        }, f, indent=2)
+    print(f"   - Parsed '{path}' in {parse_time:.3f}s, cached to '{cache_path}'")
+    return df
+
+def load_features(rebuild=False):
+    # Phase 2: company features, all sheets concatenated
+    return load_workbook(FEATURES_WORKBOOK, rebuild).drop(columns=['Sheet'])
+
+def iter_label_sheets(rebuild=False):
+    # Phase 1: yields (sheet name, frame) with only the columns that sheet actually has
+    df = load_workbook(LABELS_WORKBOOK, rebuild)
+    for sheet_name, sheet_df in df.groupby('Sheet', sort=False):
+        yield sheet_name, sheet_df.drop(columns=['Sheet']).dropna(axis=1, how='all').reset_index(drop=True)
@@ -0,0 +1,288 @@
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import sys
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.model_selection import StratifiedKFold
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+from forest import FlatForest, flatten_forest
+from features import FeaturePipeline, WORKBOOK_COLUMNS
+from data_loader import CACHE_DIR
+
+warnings.filterwarnings('ignore')
+
+# ---------------------------------------------------------
+# Cross-Validated Hyperparameter Search (accuracy vs. latency)
+# ---------------------------------------------------------
+# Every candidate forest is cross-validated on a process pool (fold features
+# are engineered once in the parent and handed to each worker once), then timed
+# with the served evaluator (backend/forest.py). The winner is the fastest
+# candidate whose CV accuracy meets the bar; it is retrained on all rows and
+# saved like a normal training run, next to a speed/accuracy report.
+#
+#   python scripts/train_model.py --search
+#   python scripts/hyperparam_search.py --accuracy-bar 0.62 --workers 8
+#
+# The feature pipeline (null medians, industry target encoding) is refitted on
+# every training fold and only applied to the test fold, so no test label
+# leaks into its own features.
+#
+# Results are appended to a JSONL file as candidates finish, so an
+# interrupted search picks up where it stopped.
+
+DEFAULT_GRID = {
+    'n_estimators': [25, 50, 100, 200],
+    'max_depth': [4, 5, 7, 9],
+    'min_samples_leaf': [1, 2, 4],
+}
+N_FOLDS = 5
+CV_VERSION = 2  # part of the data tag: results from an older CV procedure are not reused
+RANDOM_STATE = 42
+SEARCH_DIR = os.path.join(CACHE_DIR, 'hyperparam_search')
+LATENCY_BATCH = 1000
+
+def candidate_key(params):
+    return f"n{params['n_estimators']}_d{params['max_depth']}_l{params['min_samples_leaf']}"
+
+def expand_grid(grid):
+    names = sorted(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[n] for n in names))]
+
+def load_results(path, data_tag):
+    # key -> record for this data set; later lines (e.g. the latency pass) update earlier ones
+    results = {}
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    if record.get('data') != data_tag:
+                        continue
+                    results.setdefault(record['key'], {}).update(record)
+    return results
+
+def append_result(path, record):
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record) + '\n')
+
+# ---------------------------------------------------------
+# Cross-Validation (runs inside the pool workers)
+# ---------------------------------------------------------
+_worker = {}
+
+def init_worker(folds):
+    # Shared once per worker instead of once per candidate
+    _worker.update(folds=folds)
+
+def evaluate_candidate(params, forest_path):
+    scores = []
+    start = time.perf_counter()
+    for fold, (X_train, y_train, X_test, y_test) in enumerate(_worker['folds']):
+        rf = RandomForestClassifier(random_state=RANDOM_STATE, n_jobs=1, **params)
+        rf.fit(X_train, y_train)
+        scores.append(float(rf.score(X_test, y_test)))
+        if fold == 0:
+            # Timed later, one at a time, so pool load does not skew latency
+            np.savez(forest_path, **flatten_forest(rf))
+            n_nodes = int(sum(e.tree_.node_count for e in rf.estimators_))
+
+    return {
+        'key': candidate_key(params),
+        'params': params,
+        'cv_accuracy': float(np.mean(scores)),
+        'cv_std': float(np.std(scores)),
+        'fold_accuracy': scores,
+        'n_nodes': n_nodes,
+        'fit_seconds': time.perf_counter() - start,
+    }
+
+# ---------------------------------------------------------
+# Latency (parent process, pool idle)
+# ---------------------------------------------------------
+def measure_latency(forest_path, X, repeat=200):
+    with np.load(forest_path, allow_pickle=False) as data:
+        flat = FlatForest({k: data[k] for k in data.files})
+
+    rng = np.random.RandomState(0)
+    rows = X[rng.randint(0, len(X), repeat)]
+    batch = X[rng.randint(0, len(X), LATENCY_BATCH)]
+    flat.predict_proba(rows[:1])  # warm-up
+
+    single = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        flat.predict_proba(rows[i:i + 1])
+        single.append(time.perf_counter() - start)
+
+    batched = []
+    for _ in range(max(repeat // 20, 3)):
+        start = time.perf_counter()
+        flat.predict_proba(batch)
+        batched.append(time.perf_counter() - start)
+
+    return {
+        'latency_single_ms': float(np.median(single) * 1000),
+        'latency_p95_ms': float(np.percentile(single, 95) * 1000),
+        'latency_batch_us_per_row': float(np.median(batched) / LATENCY_BATCH * 1e6),
+    }
+
+# ---------------------------------------------------------
+# Search
+# ---------------------------------------------------------
+def fold_features(columns, y, train_idx, test_idx):
+    # Pipeline fitted on the training fold only, then applied to both folds
+    train = {key: values[train_idx] for key, values in columns.items()}
+    test = {key: values[test_idx] for key, values in columns.items()}
+    pipeline = FeaturePipeline.fit(train, y[train_idx])
+    X_train, train_errors = pipeline.transform_columns(train, len(train_idx))
+    X_test, test_errors = pipeline.transform_columns(test, len(test_idx))
+    bad_rows = [e for e in train_errors + test_errors if e is not None]
+    if bad_rows:
+        raise ValueError(f"Feature engineering failed for {len(bad_rows)} rows, e.g. {bad_rows[0]}")
+    return X_train, y[train_idx], X_test, y[test_idx]
+
+def pick_winner(records, accuracy_bar):
+    # Fastest candidate that meets the bar (ties: fewer nodes, then higher accuracy); None if none does
+    eligible = [r for r in records if r['cv_accuracy'] >= accuracy_bar]
+    if not eligible:
+        return None
+    return min(eligible, key=lambda r: (r['latency_single_ms'], r['n_nodes'], -r['cv_accuracy']))
+
+def print_tradeoff(records, winner, accuracy_bar):
+    print(f"\n>>> Speed / Accuracy Tradeoff (bar: CV accuracy >= {accuracy_bar:.4f})")
+    print(f"{'Candidate':<16}{'CV acc':>9}{'+/-':>8}{'Nodes':>8}{'1 row ms':>10}{'p95 ms':>9}{'us/row@1k':>11}")
+    for r in sorted(records, key=lambda r: r['latency_single_ms']):
+        mark = ' <== winner' if winner is not None and r['key'] == winner['key'] else ('' if r['cv_accuracy'] >= accuracy_bar else ' (below bar)')
+        print(f"{r['key']:<16}{r['cv_accuracy']:>9.4f}{r['cv_std']:>8.4f}{r['n_nodes']:>8}"
+              f"{r['latency_single_ms']:>10.3f}{r['latency_p95_ms']:>9.3f}{r['latency_batch_us_per_row']:>11.2f}{mark}")
+
+def run_search(grid=None, workers=None, accuracy_bar=None, tolerance=0.01,
+               results_dir=SEARCH_DIR, artifacts_path='tkd_model_artifacts.pkl', rebuild_cache=False):
+    # Imported here: train_model imports this module for --search
+    from train_model import load_merged_data, sanitize, engineer_features, save_artifacts
+
+    grid = grid or DEFAULT_GRID
+    workers = os.cpu_count() if workers is None else workers
+    os.makedirs(os.path.join(results_dir, 'forests'), exist_ok=True)
+    results_path = os.path.join(results_dir, 'results.jsonl')
+
+    merged_df = sanitize(load_merged_data(rebuild_cache))
+    X_df, y_series, pipeline = engineer_features(merged_df)
+    X = X_df.to_numpy(dtype=np.float64)
+    y = y_series.to_numpy()
+    columns = {api_name: merged_df[col].to_numpy() for col, api_name in WORKBOOK_COLUMNS.items()}
+
+    # Same folds for every candidate; results from a different data set are not reused
+    splits = StratifiedKFold(n_splits=N_FOLDS, shuffle=True, random_state=RANDOM_STATE).split(X, y)
+    folds = [fold_features(columns, y, train_idx, test_idx) for train_idx, test_idx in splits]
+    data_tag = (f"{len(X)}x{X.shape[1]}:{hashlib.sha256(X.tobytes() + y.tobytes()).hexdigest()[:12]}"
+                f":cv{CV_VERSION}")
+
+    results = load_results(results_path, data_tag)
+    candidates = expand_grid(grid)
+    todo = [p for p in candidates if candidate_key(p) not in results]
+    print(f"\n>>> Hyperparameter Search: {len(candidates)} candidates, {N_FOLDS}-fold CV, "
+          f"{len(candidates) - len(todo)} already done, {workers} worker processes")
+
+    def forest_path(params):
+        return os.path.join(results_dir, 'forests', f"{candidate_key(params)}.npz")
+
+    start = time.perf_counter()
+    if todo:
+        with ProcessPoolExecutor(max_workers=max(workers, 1), initializer=init_worker,
+                                 initargs=(folds,)) as pool:
+            futures = [pool.submit(evaluate_candidate, p, forest_path(p)) for p in todo]
+            for done, future in enumerate(as_completed(futures), 1):
+                record = future.result()
+                record['data'] = data_tag
+                append_result(results_path, record)
+                results[record['key']] = record
+                print(f"   - [{done}/{len(todo)}] {record['key']}: CV accuracy {record['cv_accuracy']:.4f} "
+                      f"({record['fit_seconds']:.1f}s)")
+    print(f"Cross-validation finished in {time.perf_counter() - start:.1f}s")
+
+    # Latency pass, sequential so the timings are comparable
+    for params in candidates:
+        record = results[candidate_key(params)]
+        if 'latency_single_ms' not in record:
+            latency = measure_latency(forest_path(params), X)
+            latency.update(key=record['key'], data=data_tag)
+            append_result(results_path, latency)
+            record.update(latency)
+
+    records = [results[candidate_key(p)] for p in candidates]
+    best = max(records, key=lambda r: r['cv_accuracy'])
+    if accuracy_bar is None:
+        accuracy_bar = best['cv_accuracy'] - tolerance
+    winner = pick_winner(records, accuracy_bar)
+    print_tradeoff(records, winner, accuracy_bar)
+    if winner is None:
+        # Nothing is saved; the CV results are kept, so a rerun with a lower bar is quick
+        raise SystemExit(f"No candidate reaches the accuracy bar {accuracy_bar:.4f} (best: {best['key']} with "
+                         f"CV accuracy {best['cv_accuracy']:.4f}); nothing saved. Lower --accuracy-bar and rerun.")
+
+    # ---------------------------------------------------------
+    # Retrain the winner on all rows and save it
+    # ---------------------------------------------------------
+    print(f"\n>>> Training Winner {winner['key']} on all {len(X)} samples...")
+    rf = RandomForestClassifier(random_state=RANDOM_STATE, **winner['params'])
+    rf.fit(X_df, y_series)
+    print("Model Score (Training Accuracy):", rf.score(X_df, y_series))
+    save_artifacts(rf, pipeline, artifacts_path)
+
+    report = {
+        'accuracy_bar': accuracy_bar,
+        'n_folds': N_FOLDS,
+        'n_samples': len(X),
+        'winner': winner,
+        'most_accurate': best,
+        'speedup_vs_most_accurate': best['latency_single_ms'] / winner['latency_single_ms'],
+        'candidates': sorted(records, key=lambda r: r['latency_single_ms']),
+    }
+    report_path = os.path.splitext(artifacts_path)[0] + '_search_report.json'
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Winner: {winner['key']} (CV accuracy {winner['cv_accuracy']:.4f}, {winner['latency_single_ms']:.3f} ms/row); "
+          f"most accurate: {best['key']} ({best['cv_accuracy']:.4f}, {best['latency_single_ms']:.3f} ms/row)")
+    print(f"Search report saved to '{report_path}'")
+    return report
+
+def parse_int_list(text):
+    return [int(v) for v in text.split(',')]
+
+def add_search_arguments(parser):
+    parser.add_argument('--n-estimators', type=parse_int_list, default=DEFAULT_GRID['n_estimators'],
+                        help="Comma-separated forest sizes to try")
+    parser.add_argument('--max-depth', type=parse_int_list, default=DEFAULT_GRID['max_depth'],
+                        help="Comma-separated tree depths to try")
+    parser.add_argument('--min-samples-leaf', type=parse_int_list, default=DEFAULT_GRID['min_samples_leaf'],
+                        help="Comma-separated leaf sizes to try")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument('--accuracy-bar', type=float, default=None,
+                        help="Minimum CV accuracy for the winner (default: best CV accuracy - tolerance)")
+    parser.add_argument('--tolerance', type=float, default=0.01,
+                        help="Accuracy the winner may give up vs. the most accurate candidate (default: 0.01)")
+    parser.add_argument('--results-dir', default=SEARCH_DIR, help=f"Resumable results directory (default: {SEARCH_DIR})")
+
+def search_from_args(args):
+    grid = {
+        'n_estimators': args.n_estimators,
+        'max_depth': args.max_depth,
+        'min_samples_leaf': args.min_samples_leaf,
+    }
+    return run_search(grid, args.workers, args.accuracy_bar, args.tolerance,
+                      args.results_dir, rebuild_cache=args.rebuild_cache)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cross-validated search over forest size, depth and leaf size")
+    add_search_arguments(parser)
+    parser.add_argument('--rebuild-cache', action='store_true',
+                        help="Re-parse the Excel workbooks instead of using the columnar cache")
+    search_from_args(parser.parse_args())
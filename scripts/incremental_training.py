@@ -0,0 +1,219 @@
+import os
+import time
+import joblib
+import numpy as np
+import pandas as pd
+
+from features import FeaturePipeline, WORKBOOK_COLUMNS
+from data_loader import CACHE_DIR
+
+# ---------------------------------------------------------
+# Incremental Training
+# ---------------------------------------------------------
+# A full build (train_model.py) re-reads, re-sanitizes and re-engineers every
+# labeled row and fits all trees from scratch. The incremental mode
+# (train_model.py --incremental) only touches rows it has not seen before:
+#
+#   1. Merged rows are identified by a content hash (+ occurrence number, for
+#      rows the join duplicates); the counts of processed hashes are kept in
+#      the training state, so only new rows go through sanitation and
+#      feature engineering. Kept rows whose hash disappeared from the merged
+#      data (edited in the workbook, or joined to another partner) are retired
+#      first, so the edited version comes back in as a new row.
+#   2. industry_map / global_mean come from running target sums and counts
+#      (per industry and overall), updated with the new rows only.
+#   3. The stored feature matrix of earlier rows is reused; only its
+#      Industry_Target_Encoded column is refreshed from the updated map.
+#   4. warm_start adds --add-trees new trees fitted on all rows; with
+#      --replace-trees the same number of oldest trees is dropped, so the
+#      forest keeps its size and gradually follows the new data. warm_start
+#      seeds a new tree by its position in the forest, which repeats once
+#      trees are dropped, so every run gets its own random_state.
+#
+# Imputation medians stay those of the last full build (a median cannot be
+# updated from running sums); run a full build now and then to re-fit them
+# and to retrain every tree on the current encoding.
+#
+# The state is tied to one artifact version: full builds and incremental
+# runs rewrite it, and a state that does not match the artifact on disk (e.g.
+# after --search saved a different forest) is refused.
+
+STATE_PATH = os.path.join(CACHE_DIR, "training_state.joblib")
+DEFAULT_ADD_TREES = 50
+RANDOM_STATE = 42  # train_model.py's; run k seeds its trees from RANDOM_STATE + k
+
+# Columns that identify a merged row (raw inputs, partner and label)
+ROW_KEY_COLUMNS = ['Company Name', 'Partner Adı', 'Target'] + list(WORKBOOK_COLUMNS)
+
+def row_hashes(merged_df):
+    # Content hash per merged row (Series on the frame's index); take it before sanitize()
+    return pd.util.hash_pandas_object(merged_df[ROW_KEY_COLUMNS], index=False)
+
+def occurrences(hashes):
+    # 0 for the first row with a given hash, 1 for its duplicate, ...
+    hashes = np.asarray(hashes)
+    return pd.Series(hashes).groupby(hashes).cumcount().to_numpy()
+
+def count_hashes(hashes):
+    # row hash -> number of rows with that hash
+    uniq, counts = np.unique(np.asarray(hashes), return_counts=True)
+    return dict(zip(uniq.tolist(), counts.tolist()))
+
+def industry_sums(industries, target):
+    # Same grouping as FeaturePipeline.fit: str keys, 'nan' is not an industry
+    sums = {}
+    for key, t in zip((str(k) for k in industries), np.asarray(target, dtype=np.float64).tolist()):
+        if key != 'nan':
+            s = sums.setdefault(key, [0.0, 0])
+            s[0] += t
+            s[1] += 1
+    return sums
+
+class TrainingState:
+    def __init__(self, version, seen, sums, target_sum, target_count, medians, X, y, industries, hashes):
+        self.version = version            # artifact version this state belongs to
+        self.seen = seen                  # row hash -> number of rows with that hash processed
+        self.sums = sums                  # industry -> [target sum, row count]
+        self.target_sum = target_sum
+        self.target_count = target_count
+        self.medians = medians
+        self.X = X                        # engineered features of the kept rows
+        self.y = y
+        self.industries = industries      # raw industry key per kept row
+        self.hashes = hashes              # row hash per kept row
+        self.runs = 0                     # incremental runs since the full build
+
+    @classmethod
+    def from_full_build(cls, hashes, industries, X, y, pipeline, version):
+        # hashes: row_hashes() of every merged row (taken before sanitation);
+        # industries, X, y: the rows that passed it
+        target = y.to_numpy(dtype=np.float64)
+        return cls(version, count_hashes(hashes), industry_sums(industries, target), float(target.sum()),
+                   len(target), dict(pipeline.medians), X.to_numpy(dtype=np.float64), y.to_numpy(),
+                   np.asarray(industries, dtype=object), hashes.loc[X.index].to_numpy())
+
+    def pipeline(self):
+        industry_map = {k: s / c for k, (s, c) in self.sums.items()}
+        return FeaturePipeline(industry_map, self.target_sum / self.target_count, self.medians)
+
+    def retire(self, current):
+        # current: count_hashes() of the merged data. Drops kept rows beyond the
+        # number of rows their hash still has; returns how many were dropped.
+        keep = occurrences(self.hashes) < np.array([current.get(h, 0) for h in self.hashes.tolist()])
+        self.seen = {h: min(n, current[h]) for h, n in self.seen.items() if h in current}
+        if keep.all():
+            return 0
+        self.add_targets(self.industries[~keep], self.y[~keep], sign=-1)
+        self.X, self.y = self.X[keep], self.y[keep]
+        self.industries, self.hashes = self.industries[keep], self.hashes[keep]
+        return int((~keep).sum())
+
+    def new_rows(self, hashes):
+        # Boolean mask of the rows not processed yet
+        seen = np.array([self.seen.get(h, 0) for h in np.asarray(hashes).tolist()])
+        return occurrences(hashes) >= seen
+
+    def mark_processed(self, hashes):
+        for h, count in count_hashes(hashes).items():
+            self.seen[h] = self.seen.get(h, 0) + count
+
+    def add_targets(self, industries, y, sign=1):
+        # Running sums behind industry_map / global_mean (sign=-1 removes rows)
+        target = np.asarray(y, dtype=np.float64)
+        for key, (s, c) in industry_sums(industries, target).items():
+            total = self.sums.setdefault(key, [0.0, 0])
+            total[0] += sign * s
+            total[1] += sign * c
+            if total[1] == 0:
+                del self.sums[key]
+        self.target_sum += sign * float(target.sum())
+        self.target_count += sign * len(target)
+
+    def append(self, industries, X, y, hashes):
+        self.X = np.vstack([self.X, X])
+        self.y = np.concatenate([self.y, y])
+        self.industries = np.concatenate([self.industries, np.asarray(industries, dtype=object)])
+        self.hashes = np.concatenate([self.hashes, hashes])
+
+def save_state(state, path=STATE_PATH):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    joblib.dump(state, path)
+
+def load_state(path=STATE_PATH):
+    return joblib.load(path) if os.path.exists(path) else None
+
+def incremental_update(artifacts_path='tkd_model_artifacts.pkl', add_trees=DEFAULT_ADD_TREES,
+                       replace_trees=False, rebuild_cache=False, export_table=False, state_path=STATE_PATH):
+    # export_table=False: only the flat forest is re-exported. The server's
+    # default engine (TKD_INFERENCE=forest) uses it; table mode notices the
+    # stale table by its fingerprint and falls back to the forest.
+    # Imported here: train_model imports this module for --incremental
+    from train_model import load_merged_data, sanitize, engineer_features, save_artifacts
+
+    start = time.perf_counter()
+    artifacts = joblib.load(artifacts_path)
+    state = load_state(state_path)
+    if state is None or state.version != artifacts.get('version'):
+        raise RuntimeError(f"No training state for artifact version {artifacts.get('version')!r} in "
+                           f"'{state_path}'; run a full build (train_model.py) first")
+
+    merged_df = load_merged_data(rebuild_cache)
+    hashes = row_hashes(merged_df)
+    retired = state.retire(count_hashes(hashes))
+    new_mask = state.new_rows(hashes)
+    print(f"\n>>> Incremental Update: {int(new_mask.sum())} new of {len(merged_df)} merged rows, "
+          f"{retired} retired")
+    if not new_mask.any() and not retired:
+        print("Nothing new to train on; artifacts unchanged.")
+        return artifacts
+
+    new_hashes = hashes[new_mask]
+    state.mark_processed(new_hashes)
+    kept_df = sanitize(merged_df[new_mask])
+    if kept_df.empty and not retired:
+        save_state(state, state_path)
+        print("All new rows were dropped by sanitation; artifacts unchanged.")
+        return artifacts
+
+    rf = artifacts['model']
+    unknown = set(kept_df['Target'].unique().tolist()) - set(rf.classes_.tolist())
+    if unknown:
+        raise RuntimeError(f"New rows introduce tiers {sorted(unknown)} the forest does not know; "
+                           "run a full build")
+
+    # Running sums -> new encoding; features for the new rows only
+    state.add_targets(kept_df['Industry Type'].to_numpy(), kept_df['Target'].to_numpy())
+    pipeline = state.pipeline()
+    if not kept_df.empty:
+        X_new, y_new, _ = engineer_features(kept_df, pipeline)
+        state.append(kept_df['Industry Type'].to_numpy(), X_new.to_numpy(dtype=np.float64), y_new.to_numpy(),
+                     new_hashes.loc[kept_df.index].to_numpy())
+
+    # Earlier rows keep their features except the re-encoded industry column
+    column = pipeline.features.index('Industry_Target_Encoded')
+    keys = np.array([str(k) for k in state.industries], dtype=object)
+    uniq, inverse = np.unique(keys, return_inverse=True)
+    state.X[:, column] = np.array([pipeline.industry_map.get(k, pipeline.global_mean) for k in uniq])[inverse]
+
+    X_all = pd.DataFrame(state.X, columns=pipeline.features)
+    n_before = len(rf.estimators_)
+    # States saved before run counting have none
+    state.runs = getattr(state, 'runs', 0) + 1
+    rf.set_params(warm_start=True, n_estimators=n_before + add_trees,
+                  random_state=RANDOM_STATE + state.runs)
+    fit_start = time.perf_counter()
+    rf.fit(X_all, state.y)  # fits only the added trees, on all rows
+    if replace_trees:
+        rf.estimators_ = rf.estimators_[add_trees:]
+        rf.n_estimators = len(rf.estimators_)
+    rf.set_params(warm_start=False)
+    print(f"   - {'Replaced' if replace_trees else 'Added'} {add_trees} trees in "
+          f"{time.perf_counter() - fit_start:.2f}s ({n_before} -> {len(rf.estimators_)} trees, "
+          f"{len(state.y)} training rows)")
+    print("Model Score (Training Accuracy):", rf.score(X_all, state.y))
+
+    artifacts = save_artifacts(rf, pipeline, artifacts_path, export_table=export_table)
+    state.version = artifacts['version']
+    save_state(state, state_path)
+    print(f"Incremental update finished in {time.perf_counter() - start:.2f}s (version {state.version})")
+    return artifacts
@@ -0,0 +1,357 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from urllib.parse import urlsplit
+import numpy as np
+
+from test_scenarios import scenarios
+
+# ---------------------------------------------------------
+# Concurrent Load Test / Latency Benchmark for /predict
+# ---------------------------------------------------------
+# Sends synthetic company profiles (sampled from the Phase 2 feature
+# distributions) or a replayed NDJSON file to a running server with asyncio,
+# either closed-loop (--concurrency clients back to back) or open-loop at a
+# fixed --rate. Latency is measured from each request's scheduled send time,
+# so queueing behind a slow server is counted instead of hidden.
+#
+#   python scripts/load_test.py --requests 20000 --concurrency 32
+#   python scripts/load_test.py --rate 500 --duration 30 --output run.json
+#   python scripts/load_test.py --replay prospects.ndjson --concurrency 8
+#   python scripts/load_test.py --url http://localhost:5328 --compare http://localhost:5329
+#   python scripts/load_test.py --concurrency 1 8 32 128 --compare http://localhost:5329
+#
+# Several --concurrency levels run one after the other (same workload) and
+# the report holds one entry per level.
+#
+# The scenarios from test_scenarios.py are mixed into the stream as a
+# correctness gate: each one is answered once on an idle server first, and
+# every answer under load must match it (plus --min-matches against the
+# scenarios' expected tiers). The exit code is 1 if the gate fails.
+#
+# Progress goes to stderr; the JSON report goes to stdout (or --output).
+
+DEFAULT_URL = "http://localhost:5328"
+PREDICT_PATH = "/predict"
+
+def log(msg):
+    print(msg, file=sys.stderr)
+
+# ---------------------------------------------------------
+# Workload
+# ---------------------------------------------------------
+def synthetic_profiles(n, seed=0):
+    # Each field is drawn from its own empirical distribution in the Phase 2
+    # workbook (run from the repo root); counts get log-normal jitter so most
+    # profiles are new to the server's prediction cache.
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+    from features import WORKBOOK_COLUMNS
+    from data_loader import load_features
+
+    df = load_features()
+    rng = np.random.RandomState(seed)
+    columns = {}
+    for col, key in WORKBOOK_COLUMNS.items():
+        values = df[col].dropna().to_numpy()
+        drawn = values[rng.randint(0, len(values), n)]
+        if key in ('employee_count', 'years_active'):
+            drawn = np.maximum(np.round(drawn.astype(float) * rng.lognormal(0, 0.3, n)), 0)
+        columns[key] = drawn
+
+    profiles = []
+    for i in range(n):
+        profile = {}
+        for key, values in columns.items():
+            v = values[i]
+            profile[key] = str(v) if key == 'industry_type' else int(v)
+        profiles.append(profile)
+    return profiles
+
+def replay_profiles(path):
+    # One JSON object per line; {"data": {...}} wrappers (scenario format) are unwrapped
+    profiles = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                profiles.append(record['data'] if isinstance(record, dict) and 'data' in record else record)
+    return profiles
+
+def build_workload(profiles, n_requests, gate_every):
+    # List of (request body, scenario index or None); profiles are cycled to n_requests
+    workload = []
+    for i in range(n_requests):
+        if gate_every and i % gate_every == 0:
+            s = (i // gate_every) % len(scenarios)
+            workload.append((json.dumps(scenarios[s]['data']).encode(), s))
+        else:
+            workload.append((json.dumps(profiles[i % len(profiles)]).encode(), None))
+    return workload
+
+# ---------------------------------------------------------
+# Minimal HTTP/1.1 Client (stdlib asyncio, keep-alive)
+# ---------------------------------------------------------
+class Connection:
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+    async def post(self, path, body):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        head = (f"POST {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n")
+        self.writer.write(head.encode('latin-1') + body)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError('Server closed the connection')
+        status = int(status_line.split()[1])
+        length = 0
+        keep_alive = status_line.startswith(b'HTTP/1.1')
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            name = name.strip().lower()
+            value = value.strip().lower()
+            if name == 'content-length':
+                length = int(value)
+            elif name == 'connection':
+                keep_alive = value == 'keep-alive'
+            elif name == 'transfer-encoding' and value != 'identity':
+                raise ValueError(f"Unsupported transfer encoding '{value}'")
+        data = await self.reader.readexactly(length)
+        if not keep_alive:
+            self.close()
+        return status, data
+
+# ---------------------------------------------------------
+# Runner
+# ---------------------------------------------------------
+async def send(pool, body, scheduled):
+    # Returns (latency seconds from the scheduled time, status or None, tier or error text)
+    conn = await pool.get()
+    try:
+        status, data = await conn.post(PREDICT_PATH, body)
+        tier = json.loads(data).get('tier') if status == 200 else data[:200].decode('utf-8', 'replace')
+    except Exception as e:
+        conn.close()
+        status, tier = None, f'{type(e).__name__}: {e}'
+    finally:
+        pool.put_nowait(conn)
+    return time.perf_counter() - scheduled, status, tier
+
+async def run_load(base_url, workload, concurrency, rate=None):
+    url = urlsplit(base_url)
+    pool = asyncio.Queue()
+    for _ in range(concurrency):
+        pool.put_nowait(Connection(url.hostname, url.port or 80))
+    results = [None] * len(workload)
+
+    start = time.perf_counter()
+    if rate:
+        # Open loop: request i is due at start + i / rate whether or not earlier ones finished
+        async def scheduled(i):
+            due = start + i / rate
+            await asyncio.sleep(max(due - time.perf_counter(), 0))
+            results[i] = await send(pool, workload[i][0], due)
+        await asyncio.gather(*(scheduled(i) for i in range(len(workload))))
+    else:
+        # Closed loop: `concurrency` clients, each sends its next request when the last one returns
+        next_index = iter(range(len(workload)))
+        async def client():
+            for i in next_index:
+                results[i] = await send(pool, workload[i][0], time.perf_counter())
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    while not pool.empty():
+        pool.get_nowait().close()
+    return results, elapsed
+
+def summarize(results, elapsed):
+    latencies = np.array([r[0] for r in results]) * 1000
+    ok = np.array([r[1] == 200 for r in results])
+    statuses = {}
+    for r in results:
+        statuses[str(r[1])] = statuses.get(str(r[1]), 0) + 1
+    return {
+        'requests': len(results),
+        'errors': int((~ok).sum()),
+        'error_rate': float((~ok).mean()) if len(results) else 0.0,
+        'elapsed_s': elapsed,
+        'rps': len(results) / elapsed if elapsed else 0.0,
+        'latency_ms': {
+            'p50': float(np.percentile(latencies, 50)),
+            'p95': float(np.percentile(latencies, 95)),
+            'p99': float(np.percentile(latencies, 99)),
+            'mean': float(latencies.mean()),
+            'max': float(latencies.max()),
+        },
+        'status_counts': statuses,
+    }
+
+# ---------------------------------------------------------
+# Correctness Gate (test_scenarios.py expectations)
+# ---------------------------------------------------------
+async def preflight(base_url):
+    # Each scenario once on an idle server: the reference answer for the load run
+    workload = [(json.dumps(s['data']).encode(), i) for i, s in enumerate(scenarios)]
+    results, _ = await run_load(base_url, workload, concurrency=1)
+    log(f"{'Scenario Name':<40} | {'Prediction':<10} | {'Match?'}")
+    log("-" * 70)
+    tiers = []
+    for s, (_, status, tier) in zip(scenarios, results):
+        if status != 200:
+            raise RuntimeError(f"Scenario '{s['name']}' failed before the load run: {tier}")
+        match = "YES" if tier == s['expected'] else f"NO (Exp: {s['expected']})"
+        log(f"{s['name']:<40} | {tier:<10} | {match}")
+        tiers.append(tier)
+    return tiers
+
+def check_gate(workload, results, reference, min_matches):
+    flips = []
+    errors = 0
+    for (_, s), (_, status, tier) in zip(workload, results):
+        if s is None:
+            continue
+        if status != 200:
+            errors += 1
+        elif tier != reference[s]:
+            flips.append({'scenario': scenarios[s]['name'], 'idle': reference[s], 'under_load': tier})
+    matches = sum(tier == s['expected'] for tier, s in zip(reference, scenarios))
+    return {
+        'checks': sum(1 for _, s in workload if s is not None),
+        'errors': errors,
+        'flips': flips[:20],
+        'n_flips': len(flips),
+        'expected_matches': matches,
+        'scenarios': len(scenarios),
+        'min_matches': min_matches,
+        'passed': not flips and not errors and matches >= min_matches,
+    }
+
+async def benchmark(base_url, workload, concurrency, args):
+    log(f"\n>>> {base_url}: correctness preflight")
+    reference = await preflight(base_url)
+
+    mode = f"open loop at {args.rate} req/s" if args.rate else "closed loop"
+    log(f"\n>>> {base_url}: {len(workload)} requests, concurrency {concurrency}, {mode}")
+    if args.warmup:
+        await run_load(base_url, workload[:args.warmup], concurrency)
+    results, elapsed = await run_load(base_url, workload, concurrency, args.rate)
+
+    report = summarize(results, elapsed)
+    report['url'] = base_url
+    report['gate'] = check_gate(workload, results, reference, args.min_matches)
+    lat = report['latency_ms']
+    log(f"   - {report['rps']:,.0f} req/s, p50 {lat['p50']:.2f} ms, p95 {lat['p95']:.2f} ms, "
+        f"p99 {lat['p99']:.2f} ms, errors {report['errors']} ({report['error_rate']:.2%})")
+    log(f"   - Gate: {'PASSED' if report['gate']['passed'] else 'FAILED'} "
+        f"({report['gate']['n_flips']} flips, {report['gate']['errors']} errors, "
+        f"{report['gate']['expected_matches']}/{len(scenarios)} scenarios as expected)")
+    return report, [r[2] if r[1] == 200 else None for r in results]
+
+async def run_level(workload, concurrency, args):
+    report_a, tiers_a = await benchmark(args.url, workload, concurrency, args)
+    if not args.compare:
+        return report_a
+
+    # Same payloads, one server after the other so they do not compete for the machine
+    report_b, tiers_b = await benchmark(args.compare, workload, concurrency, args)
+    both = [(a, b) for a, b in zip(tiers_a, tiers_b) if a is not None and b is not None]
+    comparison = {
+        'rps_ratio': report_b['rps'] / report_a['rps'] if report_a['rps'] else None,
+        'latency_ratio': {q: report_b['latency_ms'][q] / report_a['latency_ms'][q] for q in ('p50', 'p95', 'p99')},
+        'tier_agreement': sum(a == b for a, b in both) / len(both) if both else None,
+        'compared_responses': len(both),
+    }
+    log(f"\n>>> B vs A: {comparison['rps_ratio']:.2f}x req/s, p99 {comparison['latency_ratio']['p99']:.2f}x, "
+        f"tier agreement {comparison['tier_agreement']:.2%}")
+    return {'a': report_a, 'b': report_b, 'comparison': comparison}
+
+def report_gates(report):
+    if 'comparison' in report:
+        return [report['a']['gate'], report['b']['gate']]
+    return [report['gate']]
+
+def print_sweep(levels, compare):
+    log(f"\n{'Concurrency':>11} | {'A req/s':>9} | {'A p99 ms':>9}" +
+        (f" | {'B req/s':>9} | {'B p99 ms':>9} | {'B/A req/s':>9}" if compare else ''))
+    log("-" * (36 + (40 if compare else 0)))
+    for concurrency, report in levels.items():
+        a = report['a'] if compare else report
+        line = f"{concurrency:>11} | {a['rps']:>9,.0f} | {a['latency_ms']['p99']:>9.2f}"
+        if compare:
+            b = report['b']
+            line += f" | {b['rps']:>9,.0f} | {b['latency_ms']['p99']:>9.2f} | {report['comparison']['rps_ratio']:>8.2f}x"
+        log(line)
+
+async def main(args):
+    if args.replay:
+        profiles = replay_profiles(args.replay)
+    else:
+        profiles = synthetic_profiles(min(args.requests, 100000), args.seed)
+    n_requests = int(args.rate * args.duration) if args.rate and args.duration else args.requests
+    workload = build_workload(profiles, n_requests, args.gate_every)
+
+    config = {
+        'requests': n_requests,
+        'concurrency': args.concurrency if len(args.concurrency) > 1 else args.concurrency[0],
+        'rate': args.rate,
+        'source': args.replay or f'synthetic (seed {args.seed})',
+        'gate_every': args.gate_every,
+    }
+
+    if len(args.concurrency) == 1:
+        return {'config': config, **await run_level(workload, args.concurrency[0], args)}
+
+    levels = {}
+    for concurrency in args.concurrency:
+        levels[concurrency] = await run_level(workload, concurrency, args)
+    print_sweep(levels, args.compare)
+    return {'config': config, 'levels': levels}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent load test and latency benchmark for /predict")
+    parser.add_argument('--url', default=DEFAULT_URL, help=f"Server under test (default: {DEFAULT_URL})")
+    parser.add_argument('--compare', metavar='URL', help="Second server build to run the same workload against")
+    parser.add_argument('--replay', metavar='NDJSON', help="Replay request bodies from an NDJSON file instead of synthetic profiles")
+    parser.add_argument('--requests', type=int, default=5000, help="Number of requests (default: 5000)")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[16],
+                        help="Open connections (default: 16); several values run a sweep")
+    parser.add_argument('--rate', type=float, default=None, help="Open-loop request rate in req/s (default: closed loop)")
+    parser.add_argument('--duration', type=float, default=None, help="With --rate: run for this many seconds instead of --requests")
+    parser.add_argument('--warmup', type=int, default=200, help="Requests sent (and discarded) before measuring (default: 200)")
+    parser.add_argument('--gate-every', type=int, default=25, help="Mix a test scenario into every Nth request (0 = off, default: 25)")
+    parser.add_argument('--min-matches', type=int, default=0,
+                        help="Gate also fails if fewer scenarios match their expected tier")
+    parser.add_argument('--seed', type=int, default=0, help="Seed for the synthetic profiles")
+    parser.add_argument('--output', help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    report = asyncio.run(main(args))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+        log(f"\nReport saved to '{args.output}'")
+    else:
+        print(text)
+
+    levels = report['levels'].values() if 'levels' in report else [report]
+    gates = [gate for level in levels for gate in report_gates(level)]
+    sys.exit(0 if all(g['passed'] for g in gates) else 1)
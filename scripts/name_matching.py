@@ -0,0 +1,209 @@
+import json
+import os
+import re
+import time
+import unicodedata
+from collections import defaultdict
+from difflib import SequenceMatcher
+
+# ---------------------------------------------------------
+# Company Name Matching (Phase 2 features -> Phase 1 labels)
+# ---------------------------------------------------------
+# The workbooks spell the same company differently ("ABC Gıda San. ve Tic.
+# A.Ş." vs "Abc Gida"), so an exact join silently drops rows. Each Phase 2
+# name is resolved to one Phase 1 partner name, in this order:
+#
+#   exact       identical strings
+#   manual      hand-made entry in the mapping file (a null label = never match)
+#   saved       earlier automatic match whose partner still exists
+#   normalized  same key after normalize_name()
+#   fuzzy       best SequenceMatcher ratio >= threshold among the candidates
+#               sharing a blocking key, and clearly ahead of the runner-up
+#
+# Blocking keeps the fuzzy stage close to linear: a name is only compared
+# with partners that share the prefix of its first or longest token (after
+# normalization), never with the whole label sheet.
+#
+# The resolved mapping is saved (MAPPING_PATH) and reused by later runs, so
+# only new names are matched again. Edit an entry's "method" to "manual" to
+# pin it (or set its "label" to null to block a wrong match).
+
+MAPPING_PATH = "name_mapping.json"
+REPORT_PATH = os.path.join(".tkd_cache", "name_match_report.json")
+FUZZY_THRESHOLD = 0.9
+FUZZY_MARGIN = 0.02  # best candidate must beat the runner-up by this much
+BLOCK_PREFIX = 4
+MAX_BLOCK = 500  # candidates per name; larger blocks are too generic to be useful
+
+# Legal-form and trade words removed from the end of a name ("... San. ve Tic. A.Ş.")
+LEGAL_SUFFIXES = {
+    'as', 'aso', 'ltd', 'sti', 'limited', 'sirketi', 'anonim', 'san', 'sanayi', 'tic', 'ticaret',
+    've', 'and', 'inc', 'incorporated', 'corp', 'corporation', 'co', 'company', 'llc', 'plc',
+    'gmbh', 'ag', 'sa', 'nv', 'bv', 'spa', 'srl',
+}
+STOPWORDS = {'the'}
+
+# Letters NFKD does not decompose to ASCII
+_TRANSLATE = str.maketrans({'ı': 'i', 'İ': 'i', 'ß': 'ss', 'æ': 'ae', 'ø': 'o', 'đ': 'd', 'ł': 'l'})
+_DROP = re.compile(r"[.'’`´]")
+_SEPARATORS = re.compile(r"[^0-9a-z]+")
+
+def normalize_name(name):
+    # "ABC Gıda San. ve Tic. A.Ş." -> "abc gida"
+    text = unicodedata.normalize('NFKD', str(name).translate(_TRANSLATE))
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch)).casefold()
+    text = _DROP.sub('', text.replace('&', ' and '))  # "a.s." -> "as", "dodge's" -> "dodges"
+    tokens = [t for t in _SEPARATORS.split(text) if t and t not in STOPWORDS]
+    while len(tokens) > 1 and tokens[-1] in LEGAL_SUFFIXES:
+        tokens.pop()
+    return ' '.join(tokens)
+
+def blocking_keys(key):
+    tokens = key.split()
+    if not tokens:
+        return set()
+    return {tokens[0][:BLOCK_PREFIX], max(tokens, key=len)[:BLOCK_PREFIX]}
+
+class NameIndex:
+    # Normalized-name index over the label side
+    def __init__(self, names):
+        self.names = set()
+        self.by_key = defaultdict(list)  # normalized key -> raw names
+        self.blocks = defaultdict(set)   # blocking key -> normalized keys
+        for name in names:
+            if not isinstance(name, str) or name in self.names:
+                continue
+            self.names.add(name)
+            key = normalize_name(name)
+            if not key:
+                continue
+            self.by_key[key].append(name)
+            for block in blocking_keys(key):
+                self.blocks[block].add(key)
+
+    def fuzzy(self, key, threshold):
+        # (best raw name, score, runner-up score) among the candidates sharing a block
+        candidates = set()
+        for block in blocking_keys(key):
+            members = self.blocks.get(block, ())
+            if len(members) <= MAX_BLOCK:
+                candidates.update(members)
+
+        best, best_score, second_score = None, 0.0, 0.0
+        matcher = SequenceMatcher(None, autojunk=False)
+        matcher.set_seq2(key)  # SequenceMatcher caches information about seq2
+        for candidate in candidates:
+            # ratio() <= 2 * min(len) / (len + len): skip candidates that cannot reach the threshold
+            if 2 * min(len(key), len(candidate)) / (len(key) + len(candidate)) < threshold:
+                continue
+            matcher.set_seq1(candidate)
+            if matcher.real_quick_ratio() < threshold or matcher.quick_ratio() < threshold:
+                continue
+            score = matcher.ratio()
+            if score > best_score:
+                best, best_score, second_score = candidate, score, best_score
+            elif score > second_score:
+                second_score = score
+        if best is None:
+            return None, 0.0, 0.0
+        return self.by_key[best][0], best_score, second_score
+
+def load_mapping(path=MAPPING_PATH):
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def save_mapping(mapping, path=MAPPING_PATH):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(dict(sorted(mapping.items())), f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def match_names(names, label_names, mapping_path=MAPPING_PATH, threshold=FUZZY_THRESHOLD,
+                rematch=False, report_path=REPORT_PATH, save=True):
+    # Returns {name: label name} for every name that resolved (unmatched names are absent).
+    # rematch=True ignores saved automatic matches (manual entries are always kept);
+    # save=False reads the mapping file but does not rewrite it.
+    start = time.perf_counter()
+    index = NameIndex(label_names)
+    saved = load_mapping(mapping_path)
+
+    mapping = {}   # persisted: name -> {'label', 'method', 'score'}
+    resolved = {}
+    counts = defaultdict(int)
+    ambiguous = []
+    for name in dict.fromkeys(n for n in names if isinstance(n, str)):
+        entry = saved.get(name)
+        if name in index.names:
+            entry = {'label': name, 'method': 'exact', 'score': 1.0}
+        elif entry is not None and entry.get('method') == 'manual':
+            pass
+        elif (entry is not None and not rematch and entry.get('label') in index.names
+              and entry.get('method') in ('normalized', 'fuzzy')):
+            entry = dict(entry, method='saved', via=entry['method'])  # counted as 'saved' in the report
+        else:
+            key = normalize_name(name)
+            candidates = index.by_key.get(key, [])
+            if candidates:
+                entry = {'label': candidates[0], 'method': 'normalized', 'score': 1.0}
+                if len(candidates) > 1:
+                    ambiguous.append({'name': name, 'candidates': candidates})
+            else:
+                label, score, runner_up = index.fuzzy(key, threshold) if key else (None, 0.0, 0.0)
+                if label is not None and score >= threshold and score - runner_up >= FUZZY_MARGIN:
+                    entry = {'label': label, 'method': 'fuzzy', 'score': round(score, 4)}
+                else:
+                    if label is not None and score >= threshold:
+                        ambiguous.append({'name': name, 'candidates': [label], 'score': round(score, 4),
+                                          'runner_up': round(runner_up, 4)})
+                    entry = {'label': None, 'method': 'none'}
+
+        counts[entry['method']] += 1
+        if entry['method'] == 'saved':
+            mapping[name] = {'label': entry['label'], 'method': entry['via'], 'score': entry.get('score')}
+        elif entry['method'] != 'exact':  # exact matches need no entry: they resolve on their own
+            mapping[name] = entry
+        if entry.get('label') is not None:
+            resolved[name] = entry['label']
+
+    # Keep manual entries for names not in this run (e.g. another sheet was removed for now)
+    for name, entry in saved.items():
+        if entry.get('method') == 'manual' and name not in mapping:
+            mapping[name] = entry
+    if mapping_path and save:
+        save_mapping(mapping, mapping_path)
+
+    report = {
+        'names': sum(counts.values()),
+        'label_names': len(index.names),
+        'matched': len(resolved),
+        'counts': dict(counts),
+        'seconds': round(time.perf_counter() - start, 3),
+        'threshold': threshold,
+        'fuzzy': sorted(({'name': n, **e} for n, e in mapping.items() if e['method'] == 'fuzzy'),
+                        key=lambda e: e['score']),
+        'ambiguous': ambiguous,
+        'unmatched': sorted(n for n, e in mapping.items() if e['label'] is None),
+    }
+    if report_path:
+        os.makedirs(os.path.dirname(report_path) or '.', exist_ok=True)
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    print_report(report, report_path, mapping_path)
+    return resolved
+
+def print_report(report, report_path=None, mapping_path=None):
+    print(f"\n>>> Name Matching ({report['names']} names vs {report['label_names']} partners, "
+          f"{report['seconds']:.3f}s)")
+    for method in ('exact', 'manual', 'saved', 'normalized', 'fuzzy', 'none'):
+        if report['counts'].get(method):
+            print(f"   - {method:<10}: {report['counts'][method]}")
+    for entry in report['fuzzy'][:10]:
+        print(f"     fuzzy {entry['score']:.3f}: '{entry['name']}' -> '{entry['label']}'")
+    if report['ambiguous']:
+        print(f"   - {len(report['ambiguous'])} ambiguous names (see the report)")
+    if report['unmatched']:
+        print(f"   - Unmatched examples: {report['unmatched'][:5]}")
+    if report_path:
+        print(f"   - Report: '{report_path}', mapping: '{mapping_path}'")
@@ -0,0 +1,193 @@
+import json
+import os
+import time
+import numpy as np
+import pandas as pd
+
+# ---------------------------------------------------------
+# Declarative Sanitation Rules (post-merge)
+# ---------------------------------------------------------
+# The rules that drop contradictory training rows ("a company with >10k
+# employees is not a low tier", ...) live in sanitation_rules.json, shared by
+# train_model.py and analyze_correlations.py:
+#
+#   "fill":  {column: value}                     nulls replaced before the rules run
+#                                                (the kept rows carry the filled values)
+#   "rules": [{"name", "description", "when"}]   rows matching any rule are dropped
+#
+# A "when" predicate is a comparison or a combination of predicates:
+#
+#   {"column": c, "op": o, "value": v}        o: > >= < <= == != in "not in" null "not null"
+#   {"sum": [c1, c2, ...], "op": o, "value": v}  row sum of several columns
+#   {"all": [p, ...]}   {"any": [p, ...]}   {"not": p}
+#
+# The rules are validated once when loaded and evaluated on NumPy column
+# arrays: every column, sum and comparison is computed once however many rules
+# use it, and the rule masks are folded into one drop mask (plus the first
+# rule that matched each row, for the report). The input frame is neither
+# copied nor modified; the only copy is the final selection of the kept rows.
+
+RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'sanitation_rules.json')
+REPORT_PATH = os.path.join(".tkd_cache", "sanitation_report.json")
+MAX_REPORT_ROWS = 10000  # dropped rows listed in the report file
+
+COMPARISONS = {
+    '>': np.greater, '>=': np.greater_equal, '<': np.less, '<=': np.less_equal,
+    '==': np.equal, '!=': np.not_equal,
+}
+MEMBERSHIP = ('in', 'not in')
+NULL_CHECKS = ('null', 'not null')
+
+def predicate_columns(predicate):
+    # Columns a predicate reads; raises ValueError on a malformed predicate
+    if not isinstance(predicate, dict):
+        raise ValueError(f"Predicate must be an object, not {predicate!r}")
+    if 'all' in predicate or 'any' in predicate:
+        parts = predicate.get('all', predicate.get('any'))
+        if not isinstance(parts, list) or not parts:
+            raise ValueError(f"'all' / 'any' needs a non-empty list of predicates: {predicate!r}")
+        return set().union(*(predicate_columns(p) for p in parts))
+    if 'not' in predicate:
+        return predicate_columns(predicate['not'])
+
+    op = predicate.get('op')
+    if op not in COMPARISONS and op not in MEMBERSHIP and op not in NULL_CHECKS:
+        raise ValueError(f"Unknown op {op!r} in {predicate!r}")
+    if op not in NULL_CHECKS and 'value' not in predicate:
+        raise ValueError(f"Op {op!r} needs a 'value': {predicate!r}")
+    if op in MEMBERSHIP and not isinstance(predicate['value'], list):
+        raise ValueError(f"Op {op!r} needs a list 'value': {predicate!r}")
+    if 'column' in predicate:
+        return {predicate['column']}
+    if isinstance(predicate.get('sum'), list) and predicate['sum']:
+        return set(predicate['sum'])
+    raise ValueError(f"Comparison needs a 'column' or a 'sum' list: {predicate!r}")
+
+class RuleSet:
+    def __init__(self, rules, fill=None):
+        self.fill = dict(fill or {})
+        self.rules = rules
+        self.columns = set(self.fill)
+        for rule in rules:
+            if 'name' not in rule or 'when' not in rule:
+                raise ValueError(f"Rule needs a 'name' and a 'when' predicate: {rule!r}")
+            try:
+                self.columns |= predicate_columns(rule['when'])
+            except ValueError as e:
+                raise ValueError(f"Rule '{rule['name']}': {e}") from None
+
+    @classmethod
+    def load(cls, path=RULES_PATH):
+        with open(path, encoding='utf-8') as f:
+            config = json.load(f)
+        return cls(config.get('rules', []), config.get('fill'))
+
+    def masks(self, frame, columns=None):
+        # Yields (rule, boolean mask) per rule; shared sub-expressions are evaluated once.
+        # columns: arrays to use instead of the frame's (e.g. with the fills applied)
+        cache = {('column', name): values for name, values in (columns or {}).items()}
+
+        def column(name):
+            key = ('column', name)
+            if key not in cache:
+                cache[key] = frame[name].to_numpy()
+            return cache[key]
+
+        def values(predicate):
+            if 'column' in predicate:
+                return column(predicate['column'])
+            key = ('sum',) + tuple(predicate['sum'])
+            if key not in cache:
+                total = np.zeros(len(frame))
+                for name in predicate['sum']:
+                    total += column(name).astype(np.float64)
+                cache[key] = total
+            return cache[key]
+
+        def evaluate(predicate):
+            key = json.dumps(predicate, sort_keys=True)
+            if key in cache:
+                return cache[key]
+            if 'all' in predicate:
+                mask = np.logical_and.reduce([evaluate(p) for p in predicate['all']])
+            elif 'any' in predicate:
+                mask = np.logical_or.reduce([evaluate(p) for p in predicate['any']])
+            elif 'not' in predicate:
+                mask = ~evaluate(predicate['not'])
+            else:
+                op, data = predicate['op'], values(predicate)
+                if op in NULL_CHECKS:
+                    mask = pd.isna(data)
+                    mask = mask if op == 'null' else ~mask
+                elif op in MEMBERSHIP:
+                    mask = np.isin(data, predicate['value'], invert=op == 'not in')
+                else:
+                    # Missing values never match a comparison (NaN compares False)
+                    mask = COMPARISONS[op](data, predicate['value'])
+                    mask = mask & ~pd.isna(data) if op == '!=' else mask
+            cache[key] = np.asarray(mask, dtype=bool)
+            return cache[key]
+
+        for rule in self.rules:
+            yield rule, evaluate(rule['when'])
+
+    def apply(self, frame, label_column='Company Name'):
+        # Returns (kept rows with the fills applied, report); `frame` is left as it is.
+        # The report names, for every dropped row, the first rule that matched it.
+        missing = sorted(self.columns - set(frame.columns))
+        if missing:
+            raise KeyError(f"Sanitation rules refer to columns not in the data: {missing}")
+
+        start = time.perf_counter()
+        filled = {column: frame[column].fillna(value).to_numpy() for column, value in self.fill.items()}
+        first = np.full(len(frame), -1, dtype=np.int32)
+        matched = []
+        for i, (rule, mask) in enumerate(self.masks(frame, filled)):
+            matched.append(int(mask.sum()))
+            first[(first < 0) & mask] = i
+        drop = first >= 0
+        eval_seconds = time.perf_counter() - start
+
+        keep = np.flatnonzero(~drop)
+        kept = frame.take(keep)  # the one copy: kept rows only
+        for column, values in filled.items():
+            kept[column] = values[keep]
+        dropped_by = np.bincount(first[drop], minlength=len(self.rules))
+        rows = np.flatnonzero(drop)[:MAX_REPORT_ROWS]
+        labels = frame[label_column].to_numpy()[rows] if label_column in frame.columns else rows
+        report = {
+            'rows': len(frame),
+            'kept': len(kept),
+            'dropped': int(drop.sum()),
+            'eval_ms': round(eval_seconds * 1000, 3),
+            'total_ms': round((time.perf_counter() - start) * 1000, 3),
+            'rules': [{'name': rule['name'], 'description': rule.get('description', ''),
+                       'matched': matched[i], 'dropped': int(dropped_by[i])}
+                      for i, rule in enumerate(self.rules)],
+            # Positions in the input frame, so the same row can be found again
+            'dropped_rows': [{'row': int(r), 'index': str(frame.index[r]), 'label': str(label),
+                              'rule': self.rules[first[r]]['name']}
+                             for r, label in zip(rows.tolist(), labels.tolist())],
+        }
+        return kept, report
+
+def sanitize_frame(frame, rules_path=RULES_PATH, report_path=REPORT_PATH):
+    # Loads the rules, applies them and prints/saves the report; returns the kept rows
+    kept, report = RuleSet.load(rules_path).apply(frame)
+    if report_path:
+        os.makedirs(os.path.dirname(report_path) or '.', exist_ok=True)
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    print_report(report, report_path)
+    return kept
+
+def print_report(report, report_path=None):
+    print(f"   - {len(report['rules'])} rules evaluated in {report['eval_ms']:.2f} ms "
+          f"({report['total_ms']:.2f} ms with row selection)")
+    for rule in report['rules']:
+        print(f"   - {rule['name']:<24}: {rule['matched']} matched, {rule['dropped']} dropped")
+    if report['dropped']:
+        print(f"   - DROPPING {report['dropped']} Logic Violators.")
+        print(f"     Examples: {[r['label'] for r in report['dropped_rows'][:5]]}")
+    if report_path:
+        print(f"   - Report: '{report_path}'")
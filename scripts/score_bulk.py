@@ -0,0 +1,205 @@
+import argparse
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+sys.path.insert(0, BACKEND_DIR)
+from features import (FeaturePipeline, INPUT_FIELDS, WORKBOOK_COLUMNS, CLASS_NAMES,
+                      NUMERIC_FIELDS, MEDIAN_FIELDS, INDUSTRY_FIELD, DEFAULT_INDUSTRY)
+from forest import load_flat_forest
+from decision_table import load_decision_table
+
+# Offline bulk scoring: reads a CSV / NDJSON / Excel prospect file in chunks,
+# runs the same feature engineering as /predict in-process, scores the chunks
+# on a process pool and streams the results to the output file.
+#
+#   python scripts/score_bulk.py prospects.csv scored.csv --workers 8
+#
+# Input columns use the API field names (employee_count, industry_type, ...)
+# or the Phase 2 workbook headers (Employee Count, Industry Type, ...).
+
+# ---------------------------------------------------------
+# Input (chunked readers, bounded memory)
+# ---------------------------------------------------------
+def read_excel_chunks(path, chunk_size):
+    # openpyxl read-only mode streams rows instead of loading the whole workbook
+    from openpyxl import load_workbook
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        for ws in wb.worksheets:
+            rows = ws.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                continue
+            # Keep only named columns and skip blank rows (read-only sheets often report trailing empties)
+            keep = [i for i, h in enumerate(header) if h is not None and str(h).strip()]
+            names = [str(header[i]).strip() for i in keep]
+            buffer = []
+            for row in rows:
+                values = [row[i] if i < len(row) else None for i in keep]
+                if all(v is None for v in values):
+                    continue
+                buffer.append(values)
+                if len(buffer) >= chunk_size:
+                    yield pd.DataFrame(buffer, columns=names)
+                    buffer = []
+            if buffer:
+                yield pd.DataFrame(buffer, columns=names)
+    finally:
+        wb.close()
+
+def read_chunks(path, chunk_size):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.csv':
+        return pd.read_csv(path, chunksize=chunk_size)
+    if ext in ('.jsonl', '.ndjson', '.json'):
+        return pd.read_json(path, lines=True, chunksize=chunk_size)
+    if ext in ('.xlsx', '.xlsm'):
+        return read_excel_chunks(path, chunk_size)
+    raise ValueError(f"Unsupported input format '{ext}' (expected .csv, .jsonl/.ndjson or .xlsx)")
+
+# ---------------------------------------------------------
+# Scoring (runs inside the pool workers)
+# ---------------------------------------------------------
+_worker = {}
+
+# Blank cells (NaN / None) mean the field was not given, so they get the same
+# defaults /predict uses for a missing key; the median-imputed fields keep
+# their NaN, which the pipeline fills with the training median
+BLANK_DEFAULTS = {key: default for key, default in NUMERIC_FIELDS if key not in MEDIAN_FIELDS}
+BLANK_DEFAULTS[INDUSTRY_FIELD] = DEFAULT_INDUSTRY
+
+def init_worker(forest_path, table_path):
+    # Each worker loads the model once
+    model, pipeline_dict = load_flat_forest(forest_path)
+    if table_path:
+        model = load_decision_table(table_path)
+    _worker.update(model=model, pipeline=FeaturePipeline.from_dict(pipeline_dict))
+
+def score_chunk(df):
+    model = _worker['model']
+    df = df.rename(columns=lambda c: WORKBOOK_COLUMNS.get(str(c).strip(), str(c).strip()))
+    n = len(df)
+
+    columns = {}
+    for key in INPUT_FIELDS:
+        if key in df.columns:
+            values = df[key]
+            if key in BLANK_DEFAULTS:
+                values = values.where(values.notna(), BLANK_DEFAULTS[key])
+            columns[key] = values.to_numpy()
+    X, errors = _worker['pipeline'].transform_columns(columns, n)
+    ok = np.array([e is None for e in errors], dtype=bool)
+
+    probabilities = np.full((n, len(model.classes_)), np.nan)
+    if ok.any():
+        probabilities[ok] = model.predict_proba(X[ok])
+
+    tier_codes = np.zeros(n, dtype=np.int64)
+    tier_codes[ok] = model.classes_[probabilities[ok].argmax(axis=1)]
+
+    out = df.copy()
+    out['tier'] = [CLASS_NAMES.get(c) if good else None for c, good in zip(tier_codes.tolist(), ok)]
+    out['tier_code'] = np.where(ok, tier_codes, -1)
+    confidence = np.full(n, np.nan)
+    confidence[ok] = probabilities[ok].max(axis=1)
+    out['confidence'] = confidence
+    for j, code in enumerate(model.classes_.tolist()):
+        out[f'prob_{CLASS_NAMES.get(code, code)}'] = probabilities[:, j]
+    out['error'] = errors
+    return out
+
+# ---------------------------------------------------------
+# Output (streamed, in input order)
+# ---------------------------------------------------------
+class ResultWriter:
+    def __init__(self, path):
+        self.path = path
+        self.format = 'jsonl' if os.path.splitext(path)[1].lower() in ('.jsonl', '.ndjson', '.json') else 'csv'
+        self.f = open(path, 'w', encoding='utf-8', newline='')
+        self.wrote_header = False
+
+    def write(self, df):
+        if self.format == 'csv':
+            df.to_csv(self.f, header=not self.wrote_header, index=False)
+            self.wrote_header = True
+        else:
+            self.f.write(df.to_json(orient='records', lines=True, force_ascii=False, double_precision=15))
+
+    def close(self):
+        self.f.close()
+
+def usable_table(forest_path, table_path):
+    # The decision table is only valid for the forest it was built from (as in
+    # app.build_state); incremental runs and compress_forest --install leave it stale
+    if not os.path.exists(table_path):
+        print(f"WARNING: '{table_path}' is missing; scoring with the forest", file=sys.stderr)
+        return False
+    forest, _ = load_flat_forest(forest_path)
+    if load_decision_table(table_path).fingerprint != forest.fingerprint():
+        print(f"WARNING: '{table_path}' was built from a different forest; scoring with the forest "
+              f"(re-export it with train_model.py --export-only)", file=sys.stderr)
+        return False
+    return True
+
+def score_file(input_path, output_path, chunk_size=50000, workers=None, inference='forest'):
+    forest_path = os.path.join(BACKEND_DIR, 'tkd_model_forest.npz')
+    table_path = os.path.join(BACKEND_DIR, 'tkd_model_table.npz') if inference == 'table' else None
+    if table_path and not usable_table(forest_path, table_path):
+        table_path = None
+    workers = os.cpu_count() if workers is None else workers
+
+    print(f">>> Scoring '{input_path}' -> '{output_path}' ({workers or 'no'} worker processes, chunks of {chunk_size})")
+    writer = ResultWriter(output_path)
+    total_rows = 0
+    total_errors = 0
+    start = time.perf_counter()
+
+    def write(result):
+        nonlocal total_rows, total_errors
+        writer.write(result)
+        total_rows += len(result)
+        total_errors += int(result['error'].notna().sum())
+        elapsed = time.perf_counter() - start
+        print(f"   - {total_rows} rows scored ({total_rows / elapsed:,.0f} rows/sec)", file=sys.stderr)
+
+    try:
+        if workers == 0:
+            init_worker(forest_path, table_path)
+            for chunk in read_chunks(input_path, chunk_size):
+                write(score_chunk(chunk))
+        else:
+            # At most 2 chunks per worker are in flight, so memory stays bounded
+            # no matter how large the input is; results are written in input order.
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                     initargs=(forest_path, table_path)) as pool:
+                pending = deque()
+                for chunk in read_chunks(input_path, chunk_size):
+                    pending.append(pool.submit(score_chunk, chunk))
+                    if len(pending) >= 2 * workers:
+                        write(pending.popleft().result())
+                while pending:
+                    write(pending.popleft().result())
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"\n>>> Done: {total_rows} rows ({total_errors} errors) in {elapsed:.1f}s "
+          f"= {total_rows / max(elapsed, 1e-9):,.0f} rows/sec")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score a CSV / NDJSON / Excel prospect file offline")
+    parser.add_argument('input', help="Input file (.csv, .jsonl/.ndjson or .xlsx)")
+    parser.add_argument('output', help="Output file (.csv or .jsonl)")
+    parser.add_argument('--chunk-size', type=int, default=50000, help="Rows per chunk (default: 50000)")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: all cores, 0 = in-process)")
+    parser.add_argument('--inference', choices=['forest', 'table'], default='forest',
+                        help="Score with the flat forest or the precomputed decision table")
+    args = parser.parse_args()
+
+    score_file(args.input, args.output, args.chunk_size, args.workers, args.inference)
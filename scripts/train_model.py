@@ -4,30 +4,94 @@ from sklearn.ensemble import RandomForestClassifier
 from sklearn.preprocessing import LabelEncoder
 import joblib
 import warnings
+import argparse
+import os
+import sys
+import time
+
+# Backend modules (feature pipeline, flat forest export) are shared with the server
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+from forest import FlatForest, save_flat_forest
+from decision_table import save_decision_table, load_decision_table
+from features import FeaturePipeline, WORKBOOK_COLUMNS
+from data_loader import load_features, iter_label_sheets
+from name_matching import match_names, FUZZY_THRESHOLD, REPORT_PATH as NAME_REPORT_PATH
+from sanitation import sanitize_frame, REPORT_PATH as SANITATION_REPORT_PATH
+from hyperparam_search import add_search_arguments, search_from_args
+from incremental_training import (TrainingState, row_hashes, save_state, incremental_update,
+                                  DEFAULT_ADD_TREES)
 
 warnings.filterwarnings('ignore')
 
-def train_and_save_model():
+def random_feature_matrix(artifacts, n, seed=0):
+    # Random inputs in the shape of the served feature vector, used to check
+    # exported evaluators against the live model
+    rng = np.random.RandomState(seed)
+    log_emp = np.log1p(rng.randint(0, 300000, n))
+    gov = rng.randint(0, 4, n)
+    return np.column_stack([
+        log_emp,
+        np.log1p(rng.randint(0, 150, n)),
+        gov,
+        log_emp * (gov + 1),
+        rng.choice(list(artifacts['industry_map'].values()) + [artifacts['global_mean']], n),
+        rng.randint(0, 2, n),
+        rng.randint(0, 2, n)
+    ])
+
+def export_flat_forest(artifacts, path='tkd_model_forest.npz'):
+    # Flatten the forest into contiguous NumPy arrays for sklearn-free serving
+    # and check the flat evaluator against predict_proba on random inputs.
+    rf = artifacts['model']
+    save_flat_forest(path, rf, FeaturePipeline.from_artifacts(artifacts).to_dict(), artifacts.get('version'))
+
+    X_check = random_feature_matrix(artifacts, 5000)
+    flat = FlatForest.from_model(rf)
+    if not np.array_equal(flat.predict_proba(X_check), rf.predict_proba(X_check)):
+        raise RuntimeError("Flat forest export does not match predict_proba")
+
+    print(f"Saved flat forest ({len(flat.feature)} nodes, {flat.n_estimators} trees, "
+          f"version {artifacts.get('version')}) to '{path}'")
+
+def export_decision_table(artifacts, path='tkd_model_table.npz', n_check=100000):
+    # Enumerate the forest's threshold cells into the decision table used by
+    # TKD_INFERENCE=table, then run the equivalence test against the live model.
+    rf = artifacts['model']
+    flat = FlatForest.from_model(rf)
+    save_decision_table(path, flat)
+    table = load_decision_table(path)
+
+    X_check = random_feature_matrix(artifacts, n_check, seed=1)
+    expected = rf.predict_proba(X_check)
+    actual = table.predict_proba(X_check)
+    mismatched = int((expected != actual).any(axis=1).sum())
+    if mismatched:
+        raise RuntimeError(f"Decision table disagrees with the model on {mismatched}/{n_check} random inputs")
+
+    n_cells = [len(t) + 1 for t in table.thresholds]
+    print(f"Saved decision table (cells per feature: {n_cells}, {os.path.getsize(path) / 1024:.0f} KB) to '{path}'")
+    print(f"   - Equivalence check: {n_check} random inputs identical to predict_proba")
+
+def prepare_training_data(rebuild_cache=False, rematch_names=False, name_threshold=FUZZY_THRESHOLD,
+                          read_only=False):
+    # Load, merge, sanitize and engineer features. Returns (X, y, fitted pipeline).
+    # read_only=True: write neither the name mapping nor the sanitation report
+    merged_df = load_merged_data(rebuild_cache, rematch_names, name_threshold, read_only)
+    return engineer_features(sanitize(merged_df, write_report=not read_only))
+
+def load_merged_data(rebuild_cache=False, rematch_names=False, name_threshold=FUZZY_THRESHOLD,
+                     read_only=False):
+    # Features joined to their labels ('Target'), before sanitation
     print(">>> Loading Data...")
     # ---------------------------------------------------------
     # 1. Load Data (Expanded)
     # ---------------------------------------------------------
     print(">>> Loading Data (All Sheets)...")
     
-    # Load Features (All Sheets)
-    xls_p2 = pd.ExcelFile("Model Datası, Phase 2.xlsx")
-    all_features = []
-    
-    for sheet_name in xls_p2.sheet_names:
-        print(f"Loading Features from: {sheet_name}")
-        df = pd.read_excel(xls_p2, sheet_name)
-        df.columns = [c.strip() for c in df.columns]
-        all_features.append(df)
-        
-    df_phase2 = pd.concat(all_features, ignore_index=True)
+    # Load Features (All Sheets, via the shared columnar cache)
+    df_phase2 = load_features(rebuild=rebuild_cache)
     
     # Load Labels (All Sheets)
-    xls_p1 = pd.ExcelFile("Model Datası, Phase 1.xlsx")
     all_labels = []
     
     # Unified Mapping
@@ -48,10 +112,8 @@ def train_and_save_model():
         'Believe': 1, 'Guardian': 1, 'Guardians': 1, 'Guiding Partner': 1, 'Caring Partner': 1, 'Guardian Partner': 1
     }
 
-    for sheet_name in xls_p1.sheet_names:
+    for sheet_name, df in iter_label_sheets(rebuild=rebuild_cache):
         print(f"Processing sheet: {sheet_name}")
-        df = pd.read_excel(xls_p1, sheet_name)
-        df.columns = [c.strip() for c in df.columns]
         
         # Normalize Target Column
         if 'Partnerlik Seviyesi' in df.columns:
@@ -75,87 +137,87 @@ def train_and_save_model():
     # Combine all labels
     df_labels_combined = pd.concat(all_labels, ignore_index=True)
     
+    # Resolve Phase 2 company names to Phase 1 partner names (case, Turkish
+    # characters, "A.Ş." style suffixes, typos; see name_matching.py)
+    name_map = match_names(df_phase2['Company Name'], df_labels_combined['Partner Adı'],
+                           threshold=name_threshold, rematch=rematch_names,
+                           report_path=None if read_only else NAME_REPORT_PATH, save=not read_only)
+    df_phase2['Partner Key'] = df_phase2['Company Name'].map(name_map)
+
     # Merge Features & Labels
     merged_df = pd.merge(
         df_phase2, 
         df_labels_combined, 
-        left_on='Company Name', 
+        left_on='Partner Key', 
         right_on='Partner Adı', 
         how='inner'
     )
     
     merged_df.rename(columns={'Mapped_Target': 'Target'}, inplace=True)
-    
+    return merged_df
+
+def sanitize(merged_df, write_report=True):
+    # Row-wise rules, so a subset of rows can be sanitized on its own
     # --- ADVANCED SANITATION (POST-MERGE) ---
+    # Declared in sanitation_rules.json (see sanitation.py); returns the kept rows,
+    # with nulls filled, and leaves merged_df as it is
     print(f"\n>>> Sanitation Check (Pre-clean size: {len(merged_df)})")
-    
-    # Calculate Governance for filtering (Naive calculation before full engineering)
-    # Ensure cols exist
-    for col in ['ESG Content', 'UN Global Impact', 'Publicly Traded']:
-        merged_df[col] = merged_df[col].fillna(0)
-    
-    gov_score_temp = merged_df['ESG Content'] + merged_df['UN Global Impact'] + merged_df['Publicly Traded']
-    
-    # Rule 1: Drop Big (>10k) but Low Tier (<=2)
-    # "The bigger the company the greater the potential"
-    mask_big_low = (merged_df['Employee Count'] > 10000) & (merged_df['Target'] <= 2)
-    
-    # Rule 2: High Governance (>=2) but Tier 1
-    # "IPO / UN Global / Sustainability means more potential"
-    mask_high_gov_low = (gov_score_temp >= 2) & (merged_df['Target'] == 1)
-    
-    # Drop them
-    outliers = merged_df[mask_big_low | mask_high_gov_low]
-    if not outliers.empty:
-        print(f"   - DROPPING {len(outliers)} Logic Violators (Big/Public but Low Tier).")
-        print(f"     Examples: {outliers['Company Name'].head(5).tolist()}")
-        merged_df = merged_df[~ (mask_big_low | mask_high_gov_low)]
-        
+    merged_df = sanitize_frame(merged_df, report_path=SANITATION_REPORT_PATH if write_report else None)
     print(f"Final Training Set Size: {len(merged_df)} samples")
-    
+    return merged_df
+
+def engineer_features(merged_df, pipeline=None):
     # ---------------------------------------------------------
     # Feature Engineering
     # ---------------------------------------------------------
     print("\n>>> Feature Engineering...")
-    df_eng = merged_df.copy()
-    
-    # Handle Numeric Nulls
-    numeric_cols = ['Employee Count', 'Years Active']
-    for col in numeric_cols:
-        if df_eng[col].isnull().any():
-            df_eng[col] = df_eng[col].fillna(df_eng[col].median())
-
-    # Log Transforms
-    df_eng['Log_Employee'] = np.log1p(df_eng['Employee Count'])
-    df_eng['Log_Years'] = np.log1p(df_eng['Years Active'])
-    
-    # Governance Score
-    df_eng['Governance_Score'] = (
-        df_eng['ESG Content'] + 
-        df_eng['UN Global Impact'] + 
-        df_eng['Publicly Traded']
-    )
-    
-    # Interaction
-    df_eng['Size_x_Gov'] = df_eng['Log_Employee'] * (df_eng['Governance_Score'] + 1)
-    
-    # Industry Encoding
-    # For production, we need to save the map
-    industry_means = df_eng.groupby('Industry Type')['Target'].mean()
-    # Fill any missing industry in future (if new appears) with global mean
-    global_mean = df_eng['Target'].mean()
-    
-    df_eng['Industry_Target_Encoded'] = df_eng['Industry Type'].map(industry_means).fillna(global_mean)
+    # Shared pipeline (backend/features.py): the server runs the same code.
+    # Fitted here once (unless given): null medians and industry target encoding.
+    columns = {api_name: merged_df[col].to_numpy() for col, api_name in WORKBOOK_COLUMNS.items()}
+    y = merged_df['Target']
+
+    if pipeline is None:
+        pipeline = FeaturePipeline.fit(columns, y)
+    X_values, errors = pipeline.transform_columns(columns, len(merged_df))
+    bad_rows = [e for e in errors if e is not None]
+    if bad_rows:
+        raise ValueError(f"Feature engineering failed for {len(bad_rows)} rows, e.g. {bad_rows[0]}")
+
+    X = pd.DataFrame(X_values, columns=pipeline.features, index=merged_df.index)
+    return X, y, pipeline
+
+def save_artifacts(rf, pipeline, path='tkd_model_artifacts.pkl', export_table=True):
+    # ---------------------------------------------------------
+    # Saving Artifacts
+    # ---------------------------------------------------------
+    print("\n>>> Saving Model & Artifacts...")
+
+    # Reported by the server with every prediction: training time + content hash of the trees
+    version = f"{time.strftime('%Y%m%d-%H%M%S')}-{FlatForest.from_model(rf).fingerprint()[:8]}"
     
-    features = [
-        'Log_Employee', 'Log_Years', 
-        'Governance_Score', 'Size_x_Gov',
-        'Industry_Target_Encoded',
-        'Business Type', 'Is Subsidiary'
-    ]
+    artifacts = {
+        'model': rf,
+        'version': version,
+        'pipeline': pipeline.to_dict(),
+        # V1.5 keys, kept for older readers of the artifact
+        'industry_map': pipeline.industry_map,
+        'global_mean': pipeline.global_mean,
+        'features': pipeline.features
+    }
     
-    X = df_eng[features]
-    y = df_eng['Target']
+    joblib.dump(artifacts, path)
+    print(f"Saved to '{path}'")
+
+    out_dir = os.path.dirname(path)
+    export_flat_forest(artifacts, os.path.join(out_dir, 'tkd_model_forest.npz'))
+    if export_table:
+        export_decision_table(artifacts, os.path.join(out_dir, 'tkd_model_table.npz'))
+    return artifacts
+
+def train_and_save_model(rebuild_cache=False, rematch_names=False, name_threshold=FUZZY_THRESHOLD):
+    merged_df = load_merged_data(rebuild_cache, rematch_names, name_threshold)
+    hashes = row_hashes(merged_df)  # of the raw rows, as incremental runs see them
+    X, y, pipeline = engineer_features(sanitize(merged_df))
     
     # ---------------------------------------------------------
     # Model Training
@@ -172,20 +234,45 @@ def train_and_save_model():
     
     print("Model Score (Training Accuracy):", rf.score(X, y))
     
-    # ---------------------------------------------------------
-    # Saving Artifacts
-    # ---------------------------------------------------------
-    print("\n>>> Saving Model & Artifacts...")
-    
-    artifacts = {
-        'model': rf,
-        'industry_map': industry_means.to_dict(),
-        'global_mean': global_mean,
-        'features': features
-    }
-    
-    joblib.dump(artifacts, 'tkd_model_artifacts.pkl')
-    print("Saved to 'tkd_model_artifacts.pkl'")
+    artifacts = save_artifacts(rf, pipeline)
+
+    # Starting point for `--incremental` runs (see incremental_training.py)
+    industries = merged_df.loc[X.index, 'Industry Type'].to_numpy()
+    save_state(TrainingState.from_full_build(hashes, industries, X, y, pipeline, artifacts['version']))
 
 if __name__ == "__main__":
-    train_and_save_model()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--export-only', metavar='ARTIFACTS',
+                        help="Skip training; only write the flat forest and decision table exports for an existing .pkl")
+    parser.add_argument('--rebuild-cache', action='store_true',
+                        help="Re-parse the Excel workbooks instead of using the columnar cache")
+    parser.add_argument('--search', action='store_true',
+                        help="Cross-validate a grid of forests on all cores and save the fastest one that meets the accuracy bar")
+    parser.add_argument('--rematch-names', action='store_true',
+                        help="Match every company name again instead of reusing the saved name mapping (manual entries are kept)")
+    parser.add_argument('--name-threshold', type=float, default=FUZZY_THRESHOLD,
+                        help=f"Minimum similarity for an approximate name match (default: {FUZZY_THRESHOLD})")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Train only on rows added since the last build: update the encoding and add trees")
+    parser.add_argument('--add-trees', type=int, default=DEFAULT_ADD_TREES,
+                        help=f"With --incremental: number of trees to add (default: {DEFAULT_ADD_TREES})")
+    parser.add_argument('--replace-trees', action='store_true',
+                        help="With --incremental: drop as many of the oldest trees as were added (constant forest size)")
+    parser.add_argument('--with-table', action='store_true',
+                        help="With --incremental: also rebuild the decision table (slow; TKD_INFERENCE=table only)")
+    add_search_arguments(parser)
+    args = parser.parse_args()
+
+    if args.export_only:
+        artifacts = joblib.load(args.export_only)
+        out_dir = os.path.dirname(args.export_only)
+        export_flat_forest(artifacts, os.path.join(out_dir, 'tkd_model_forest.npz'))
+        export_decision_table(artifacts, os.path.join(out_dir, 'tkd_model_table.npz'))
+    elif args.search:
+        search_from_args(args)
+    elif args.incremental:
+        incremental_update(add_trees=args.add_trees, replace_trees=args.replace_trees,
+                           rebuild_cache=args.rebuild_cache, export_table=args.with_table)
+    else:
+        train_and_save_model(rebuild_cache=args.rebuild_cache, rematch_names=args.rematch_names,
+                             name_threshold=args.name_threshold)